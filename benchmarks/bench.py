@@ -0,0 +1,180 @@
+"""
+Benchmark the stages of java2py on a synthetic java interface tree
+
+Times listing, parsing, type resolution, documentation decoding and rendering (with jinja and with the emitter)
+separately, records peak memory per stage and compares the results with a stored baseline. Runs offline, the jdk
+and burp-extender-api submodules are not needed.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "java2py"))
+
+import doc  # noqa: E402
+from emitter import Emitter  # noqa: E402
+from java2py import JavaToPython, PackageRenderer, TypeResolver  # noqa: E402
+from package import parse_source  # noqa: E402
+from synthetic import add_arguments, from_arguments  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(ROOT, "templates")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ["listing", "parsing", "resolving", "docs", "rendering", "emitting"]
+
+
+class Run(object):
+    """
+    State shared between the stages of one benchmark run
+    """
+    def __init__(self, source_dir, package_names):
+        self.source_dir = source_dir
+        self.package_names = package_names
+        self.j2p = None  # type: JavaToPython
+        self.packages = []
+        self.klassfiles = []
+
+    def listing(self):
+        self.j2p = JavaToPython(self.source_dir)
+        self.packages = [self.j2p.open_package(name) for name in self.package_names]
+        for package in self.packages:
+            package.list_class_names()
+
+    def parsing(self):
+        self.klassfiles = []
+        for package in self.packages:
+            for name in package.list_class_names():
+                klassfile = parse_source(name, package.read_class_file(name))
+                self.j2p.parse_cache.put(package.name, name, klassfile)
+                if klassfile is not None and klassfile.klass is not None:
+                    self.klassfiles.append(klassfile)
+
+    def resolving(self):
+        resolver = self.j2p.get_type_resolver()
+        for klassfile in self.klassfiles:
+            for name in klassfile.klass.inheritance:
+                resolver.resolve_type(name)
+            for constant in klassfile.klass.constants:
+                resolver.python_resolve(constant.type)
+            for method in klassfile.klass.methods:
+                resolver.python_resolve(method.return_type, klassfile=klassfile)
+                for parameter in method.parameters:
+                    resolver.python_resolve(parameter.type)
+
+    def docs(self):
+        doc.decode_documentation.cache_clear()
+        for klassfile in self.klassfiles:
+            klassfile.klass.documentation.to_string()
+            for method in klassfile.klass.methods:
+                documentation = method.documentation
+                if documentation is not None:
+                    documentation.to_string()
+                    documentation.parameters
+
+    def rendering(self):
+        for package in self.packages:
+            # fresh resolver, so rendering does not reuse the types resolved by the resolving stage
+            renderer = PackageRenderer(template_dir=TEMPLATE_DIR, type_resolver=TypeResolver(self.j2p),
+                                       package=package)
+            renderer.render()
+
+    def emitting(self):
+        for package in self.packages:
+            resolver = TypeResolver(self.j2p)
+            renderer = PackageRenderer(template_dir=TEMPLATE_DIR, type_resolver=resolver, package=package,
+                                       environment=Emitter(resolver))
+            renderer.render()
+
+
+def measure(source_dir, package_names, repeat):
+    """
+    Run all stages repeat times, and once more under tracemalloc for peak memory
+    :return: dict of stage name to {"seconds": best wall time, "peak_kb": peak memory allocated during the stage}
+    """
+    results = {stage: {"seconds": None, "peak_kb": None} for stage in STAGES}
+    for _ in range(repeat):
+        run = Run(source_dir, package_names)
+        for stage in STAGES:
+            gc.collect()
+            started = time.perf_counter()
+            getattr(run, stage)()
+            elapsed = time.perf_counter() - started
+            best = results[stage]["seconds"]
+            results[stage]["seconds"] = round(elapsed if best is None else min(best, elapsed), 6)
+
+    run = Run(source_dir, package_names)
+    tracemalloc.start()
+    for stage in STAGES:
+        gc.collect()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        getattr(run, stage)()
+        results[stage]["peak_kb"] = round((tracemalloc.get_traced_memory()[1] - before) / 1024, 1)
+    tracemalloc.stop()
+    return results
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """
+    Print results next to the baseline
+    :return: list of stages that are slower than threshold times the baseline, by more than min_seconds
+    """
+    regressions = []
+    print(f"{'stage':<12}{'seconds':>10}{'baseline':>10}{'ratio':>8}{'peak kb':>12}")
+    for stage in STAGES:
+        seconds = results[stage]["seconds"]
+        base = baseline.get("stages", {}).get(stage, {}).get("seconds") if baseline else None
+        ratio = seconds / base if base else None
+        flag = ""
+        if ratio is not None and ratio > threshold and seconds - base > min_seconds:
+            regressions.append(stage)
+            flag = "  REGRESSION"
+        print(f"{stage:<12}{seconds:>10.4f}{base if base else float('nan'):>10.4f}"
+              f"{ratio if ratio else float('nan'):>8.2f}{results[stage]['peak_kb']:>12.1f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark java2py stages on a synthetic java api")
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs, the best run is reported")
+    parser.add_argument("--baseline", type=str, default=BASELINE, help="baseline file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio reported as regression")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="ignore slowdowns smaller than this, timings of very short stages are mostly noise")
+    parser.add_argument("--update-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--output", type=str, help="write results as json to this file")
+    args = parser.parse_args()
+
+    api = from_arguments(args)
+    config = {key: value for key, value in vars(args).items()
+              if key in ("packages", "classes", "methods", "imports", "generics", "doc_lines", "seed")}
+    with tempfile.TemporaryDirectory(prefix="java2py-bench-") as source_dir:
+        package_names = api.write(source_dir)
+        results = measure(source_dir, package_names, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        if baseline.get("config") != config:
+            sys.stderr.write("baseline was recorded with a different configuration, not comparing\n")
+            baseline = None
+
+    regressions = compare(results, baseline, args.threshold, args.min_seconds)
+    report = {"config": config, "stages": results}
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+            fp.write("\n")
+    if regressions and not args.update_baseline:
+        sys.stderr.write(f"regressions: {', '.join(regressions)}\n")
+        sys.exit(1)
@@ -0,0 +1,111 @@
+"""
+Golden check of the emitter backend: renders every stock template with jinja and with the emitter and compares
+the output byte for byte, for every documentation level
+
+Runs on a synthetic java api by default, --sourcedir and --package check real sources (burp, the JDK's src.zip).
+Exits with status 1 on the first differences.
+"""
+import argparse
+import datetime
+import difflib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "java2py"))
+
+import doc  # noqa: E402
+from emitter import TEMPLATES_DIGEST, Emitter, templates_digest  # noqa: E402
+from java2py import JavaToPython, TypeResolver, create_environment  # noqa: E402
+from package import PackageTemplateHelper  # noqa: E402
+from synthetic import add_arguments, from_arguments  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(ROOT, "templates")
+
+
+def now():
+    return datetime.datetime(2020, 1, 2, 3, 4, 5, 678901)
+
+
+def renderings(environment, j2p, package_names, level):
+    """
+    :param level: documentation level to render with
+    :return: iterator of (description, rendered text) for every template the emitter reproduces
+    """
+    for package_name in package_names:
+        helper = PackageTemplateHelper(j2p.open_package(package_name))
+        for template_name in ("class.txt", "stub.txt"):
+            yield f"{package_name} {template_name}", environment.get_template(template_name).render(package=helper,
+                                                                                                  now=now, docs=level)
+        klassfiles = helper.ordered_klasses()
+        imports = [imp for klassfile in klassfiles for imp in klassfile.imports]
+        yield f"{package_name} header.txt", environment.get_template("header.txt").render(imports=imports, now=now)
+        body = "".join(environment.get_template("stub_klass.txt").render(klassfile=klassfile)
+                       for klassfile in klassfiles)
+        yield f"{package_name} stub_header.txt", environment.get_template("stub_header.txt").render(
+            package=helper, imports=imports, body=body, now=now)
+        yield f"{package_name} docs.txt", environment.get_template("docs.txt").render(now=now)
+        yield f"{package_name} init.txt", environment.get_template("init.txt").render(
+            klass_names=[klassfile.klass.name for klassfile in klassfiles], now=now)
+        for klassfile in klassfiles:
+            name = f"{package_name}.{klassfile.klass_name}"
+            yield f"{name} klass.txt", environment.get_template("klass.txt").render(klassfile=klassfile, docs=level)
+            yield f"{name} stub_klass.txt", environment.get_template("stub_klass.txt").render(klassfile=klassfile)
+            yield f"{name} module.txt", environment.get_template("module.txt").render(package=helper,
+                                                                                      klassfile=klassfile, now=now,
+                                                                                      docs=level)
+
+
+def check(j2p, package_names, level):
+    """
+    :return: number of renderings that differ
+    """
+    resolver = TypeResolver(j2p)
+    jinja_environment = create_environment(TEMPLATE_DIR, resolver)
+    started = time.perf_counter()
+    expected = list(renderings(jinja_environment, j2p, package_names, level))
+    jinja_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    emitted = list(renderings(Emitter(resolver), j2p, package_names, level))
+    emitter_seconds = time.perf_counter() - started
+
+    failures = 0
+    for (description, text), (_, emitted_text) in zip(expected, emitted):
+        if text == emitted_text:
+            continue
+        failures += 1
+        if failures <= 3:
+            sys.stdout.write(f"docs={level} {description} differs\n")
+            sys.stdout.writelines(difflib.unified_diff(text.splitlines(True), emitted_text.splitlines(True),
+                                                       "jinja", "emitter", n=2))
+    print(f"docs={level:<8}{len(expected):>7} renderings{failures:>5} differ   "
+          f"jinja {jinja_seconds:.3f}s  emitter {emitter_seconds:.3f}s")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Compare emitter output with the jinja templates")
+    add_arguments(parser)
+    parser.add_argument("--sourcedir", type=str, help="java sources to check instead of the synthetic api")
+    parser.add_argument("--package", type=str, nargs="+", help="packages of --sourcedir, nested packages included")
+    args = parser.parse_args()
+
+    if templates_digest(TEMPLATE_DIR) != TEMPLATES_DIGEST:
+        sys.stderr.write("templates/ changed, update the emitter and emitter.TEMPLATES_DIGEST\n")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix="java2py-golden-") as source_dir:
+        if args.sourcedir is not None:
+            if args.package is None:
+                parser.error("--sourcedir requires --package")
+            j2p = JavaToPython(args.sourcedir)
+            package_names = sorted({name for prefix in args.package for name in j2p.find_packages(prefix)})
+        else:
+            package_names = from_arguments(args).write(source_dir)
+            j2p = JavaToPython(source_dir)
+        failures = sum(check(j2p, package_names, level) for level in doc.DOCUMENTATION_LEVELS)
+        j2p.close()
+    if failures > 0:
+        sys.exit(1)
@@ -0,0 +1,147 @@
+"""
+Generate synthetic java interface trees for benchmarking java2py
+
+The generated sources look like the burp extender api: interfaces with javadoc, constants, generic
+collections and cross-package imports. Output is deterministic for a given seed.
+"""
+import argparse
+import os
+import random
+
+BASIC_TYPES = ["int", "long", "boolean", "byte", "short", "double", "float", "char"]
+LIBRARY_TYPES = ["String", "Object", "byte[]", "int[]", "String[]"]
+WORDS = ("request response header body parameter cookie scanner insertion point issue proxy intruder "
+         "repeater extension callback message editor tab listener context menu factory session handler "
+         "returns the value which is used by burp to identify a target &amp; tool").split()
+
+
+class SyntheticApi(object):
+    def __init__(self, packages=3, classes=20, methods=10, imports=5, generics=0.3, doc_lines=4, seed=0):
+        """
+        :param packages: number of packages
+        :param classes: classes per package
+        :param methods: methods per class
+        :param imports: imports per class
+        :param generics: share of reference types that are generic List<...>
+        :param doc_lines: javadoc description lines per class and method
+        :param seed: random seed
+        """
+        self.packages = packages
+        self.classes = classes
+        self.methods = methods
+        self.imports = imports
+        self.generics = generics
+        self.doc_lines = doc_lines
+        self.random = random.Random(seed)
+
+    def package_name(self, i):
+        return f"synthetic.pkg{i}"
+
+    def class_name(self, i):
+        return f"IType{i}"
+
+    def sentence(self):
+        words = self.random.choices(WORDS, k=self.random.randint(6, 12))
+        return " ".join(words).capitalize() + "."
+
+    def javadoc(self, indent, params=(), returns=False):
+        lines = [f"{indent}/**"]
+        for _ in range(self.doc_lines):
+            lines.append(f"{indent} * {self.sentence()}")
+        if params or returns:
+            lines.append(f"{indent} *")
+        for param in params:
+            lines.append(f"{indent} * @param {param} {self.sentence()}")
+        if returns:
+            lines.append(f"{indent} * @return {self.sentence()}")
+        lines.append(f"{indent} */")
+        return "\n".join(lines)
+
+    def reference_type(self, package, klass):
+        i = self.random.randrange(self.packages)
+        j = self.random.randrange(self.classes)
+        if (i, j) == (package, klass):
+            name = "String"
+        else:
+            name = self.class_name(j)
+        if self.random.random() < self.generics:
+            return f"List<{name}>"
+        return name
+
+    def type(self, package, klass):
+        choice = self.random.random()
+        if choice < 0.3:
+            return self.random.choice(BASIC_TYPES)
+        if choice < 0.5:
+            return self.random.choice(LIBRARY_TYPES)
+        return self.reference_type(package, klass)
+
+    def class_source(self, package, klass):
+        lines = [f"package {self.package_name(package)};", "", "import java.util.List;"]
+        for _ in range(self.imports):
+            i = self.random.randrange(self.packages)
+            if i != package:
+                lines.append(f"import {self.package_name(i)}.{self.class_name(self.random.randrange(self.classes))};")
+        lines.append("")
+        lines.append(self.javadoc(""))
+        extends = ""
+        if klass > 0 and self.random.random() < 0.3:
+            extends = f" extends {self.class_name(self.random.randrange(klass))}"
+        lines.append(f"public interface {self.class_name(klass)}{extends}")
+        lines.append("{")
+        for constant in range(self.random.randint(0, 3)):
+            lines.append(f"    static final int CONSTANT_{constant} = {constant};")
+        for method in range(self.methods):
+            params = [f"arg{p}" for p in range(self.random.randint(0, 4))]
+            return_type = "void" if self.random.random() < 0.3 else self.type(package, klass)
+            lines.append("")
+            lines.append(self.javadoc("    ", params, returns=return_type != "void"))
+            signature = ", ".join(f"{self.type(package, klass)} {param}" for param in params)
+            lines.append(f"    {return_type} method{method}({signature});")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, source_dir):
+        """
+        Write synthetic source tree
+        :param source_dir: directory to write java packages to
+        :return: list of package names
+        """
+        package_names = []
+        for package in range(self.packages):
+            package_name = self.package_name(package)
+            package_dir = os.path.join(source_dir, *package_name.split("."))
+            os.makedirs(package_dir, exist_ok=True)
+            for klass in range(self.classes):
+                with open(os.path.join(package_dir, self.class_name(klass) + ".java"), "w", encoding="utf-8") as fp:
+                    fp.write(self.class_source(package, klass))
+            package_names.append(package_name)
+        lang_dir = os.path.join(source_dir, "java", "lang")
+        os.makedirs(lang_dir, exist_ok=True)
+        with open(os.path.join(lang_dir, "String.java"), "w", encoding="utf-8") as fp:
+            fp.write("package java.lang;\n\n/** Strings. */\npublic final class String {\n}\n")
+        return package_names
+
+
+def add_arguments(parser):
+    parser.add_argument("--packages", type=int, default=3, help="number of packages")
+    parser.add_argument("--classes", type=int, default=20, help="classes per package")
+    parser.add_argument("--methods", type=int, default=10, help="methods per class")
+    parser.add_argument("--imports", type=int, default=5, help="imports per class")
+    parser.add_argument("--generics", type=float, default=0.3, help="share of reference types that are generic")
+    parser.add_argument("--doc-lines", type=int, default=4, help="javadoc lines per class and method")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+
+def from_arguments(args):
+    return SyntheticApi(packages=args.packages, classes=args.classes, methods=args.methods, imports=args.imports,
+                        generics=args.generics, doc_lines=args.doc_lines, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Generate a synthetic java interface tree")
+    parser.add_argument("--outdir", type=str, help="directory to write java sources to", required=True)
+    add_arguments(parser)
+    args = parser.parse_args()
+    for name in from_arguments(args).write(args.outdir):
+        print(name)
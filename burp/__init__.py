@@ -3,8 +3,11 @@ from .burp import *
 from types import ModuleType
 import sys
 
-# Install empty Java modules
-module = ModuleType("java")
-sys.modules["java"] = module
-module = ModuleType("java.net")
-sys.modules["java.net"] = module
+# Install empty Java modules, unless real ones are available (Jython or generated java stubs)
+try:
+    import java.net
+except ImportError:
+    module = ModuleType("java")
+    sys.modules["java"] = module
+    module = ModuleType("java.net")
+    sys.modules["java.net"] = module
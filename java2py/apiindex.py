@@ -0,0 +1,354 @@
+"""
+SQLite index of a java api
+
+Holds what the generator extracts from the sources: packages and the classes they list, and for every indexed
+class its imports, inheritance edges (with the base class qualified as javac would), methods (by their java
+name), parameters, constants, their types and the raw javadoc. Other tools query it with plain SQL instead of
+parsing java, the generator and the TypeResolver read it in place of a source tree:
+
+    SELECT packages.name, classes.name, methods.name FROM methods
+        JOIN classes ON classes.id = methods.class_id JOIN packages ON packages.id = classes.package_id
+
+Types are interned in the types table, a generic type refers to its type argument (argument_id). Classes that
+are only listed (not indexed) have status "listed" and no detail rows, classes that could not be parsed have
+status "error". The database is opened read only and memory mapped.
+"""
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Tuple, Union
+
+from common import GENERATOR_VERSION, Import, Type
+from klass import Constant, Klass, KlassFile
+from manifest import OutputFiles
+from method import Method, Parameter
+from symbols import SymbolIndex
+
+# Bump when the schema changes
+INDEX_FORMAT = "2"
+SQLITE_MAGIC = b"SQLite format 3\0"
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE packages (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE classes (
+    id INTEGER PRIMARY KEY,
+    package_id INTEGER NOT NULL REFERENCES packages (id),
+    file_name TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('listed', 'indexed', 'error')),
+    source_digest TEXT,
+    name TEXT,
+    modifiers TEXT,
+    docstr TEXT,
+    file_docstr TEXT,
+    UNIQUE (package_id, file_name)
+);
+CREATE TABLE imports (
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    static INTEGER NOT NULL,
+    wildcard INTEGER NOT NULL
+);
+CREATE TABLE inheritance (
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    position INTEGER NOT NULL,
+    base TEXT NOT NULL,
+    qualified_base TEXT
+);
+CREATE TABLE types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    basic INTEGER NOT NULL,
+    dimensions INTEGER NOT NULL,
+    has_arguments INTEGER NOT NULL,
+    argument_id INTEGER REFERENCES types (id)
+);
+CREATE TABLE methods (
+    id INTEGER PRIMARY KEY,
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    modifiers TEXT NOT NULL,
+    return_type_id INTEGER REFERENCES types (id),
+    docstr TEXT
+);
+CREATE TABLE parameters (
+    method_id INTEGER NOT NULL REFERENCES methods (id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type_id INTEGER REFERENCES types (id)
+);
+CREATE TABLE constants (
+    class_id INTEGER NOT NULL REFERENCES classes (id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    type_id INTEGER REFERENCES types (id),
+    docstr TEXT
+);
+CREATE INDEX classes_name ON classes (name);
+CREATE INDEX imports_class ON imports (class_id);
+CREATE INDEX inheritance_class ON inheritance (class_id);
+CREATE INDEX inheritance_base ON inheritance (qualified_base);
+CREATE INDEX methods_class ON methods (class_id);
+CREATE INDEX parameters_method ON parameters (method_id);
+CREATE INDEX constants_class ON constants (class_id);
+"""
+
+
+def is_index(path: str) -> bool:
+    """
+    :return: True if path is an SQLite database, such as an api index
+    """
+    try:
+        with open(path, "rb") as fp:
+            return fp.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def source_digest(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def join_modifiers(modifiers: Tuple[str, ...]) -> str:
+    return " ".join(modifiers)
+
+
+def split_modifiers(modifiers: str) -> Tuple[str, ...]:
+    return tuple(modifiers.split()) if modifiers else ()
+
+
+class ApiIndexWriter(object):
+    """
+    Writes an api index, the file only replaces an existing index once close() completes it
+    """
+    def __init__(self, filename: str, symbols: SymbolIndex):
+        """
+        :param symbols: every package and class of the source tree, listed in the index
+        """
+        self.filename = filename
+        self.symbols = symbols
+        self.tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        if os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+        self.connection = sqlite3.connect(self.tmp_filename)
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                    [("format", INDEX_FORMAT), ("generator", GENERATOR_VERSION)])
+        self.class_ids = {}  # type: Dict[Tuple[str, str], int]
+        self.type_ids = {}  # type: Dict[Type, int]
+        for package_name, class_names in symbols.packages.items():
+            package_id = self.connection.execute("INSERT INTO packages (name) VALUES (?)",
+                                                 (package_name,)).lastrowid
+            for class_name in class_names:
+                self.class_ids[(package_name, class_name)] = self.connection.execute(
+                    "INSERT INTO classes (package_id, file_name, status) VALUES (?, ?, 'listed')",
+                    (package_id, class_name)).lastrowid
+
+    def type_id(self, typeobj: Union[Type, None]) -> Union[int, None]:
+        """
+        Id of an interned type, its type argument is interned first
+        """
+        if typeobj is None:
+            return None
+        type_id = self.type_ids.get(typeobj)
+        if type_id is None:
+            if any(dimension is not None for dimension in typeobj.dimensions):
+                raise ValueError(f"Can not index sized array type {typeobj}")
+            argument_id = self.type_id(typeobj.argument)
+            type_id = self.connection.execute(
+                "INSERT INTO types (name, basic, dimensions, has_arguments, argument_id) VALUES (?, ?, ?, ?, ?)",
+                (typeobj.name, typeobj.basic, len(typeobj.dimensions), typeobj.has_arguments, argument_id)
+            ).lastrowid
+            self.type_ids[typeobj] = type_id
+        return type_id
+
+    def add(self, package_name: str, klass_name: str, klassfile: Union[KlassFile, None], digest: str):
+        """
+        Index a parsed class
+        :param klassfile: parsed class, None if it could not be parsed
+        :param digest: source_digest of the class source
+        """
+        class_id = self.class_ids[(package_name, klass_name)]
+        execute = self.connection.execute
+        if klassfile is None:
+            execute("UPDATE classes SET status = 'error', source_digest = ? WHERE id = ?", (digest, class_id))
+            return
+        klass = klassfile.klass
+        if klass is None:
+            execute("UPDATE classes SET status = 'indexed', source_digest = ?, file_docstr = ? WHERE id = ?",
+                    (digest, klassfile.docstr, class_id))
+        else:
+            execute("UPDATE classes SET status = 'indexed', source_digest = ?, name = ?, modifiers = ?, docstr = ?, "
+                    "file_docstr = ? WHERE id = ?",
+                    (digest, klass.name, join_modifiers(klass.modifiers), klass.docstr, klassfile.docstr, class_id))
+        self.connection.executemany(
+            "INSERT INTO imports (class_id, position, path, static, wildcard) VALUES (?, ?, ?, ?, ?)",
+            [(class_id, position, imp.path, imp.static, imp.wildcard)
+             for position, imp in enumerate(klassfile.imports)])
+        if klass is None:
+            return
+        self.connection.executemany(
+            "INSERT INTO inheritance (class_id, position, base, qualified_base) VALUES (?, ?, ?, ?)",
+            [(class_id, position, base,
+              self.symbols.qualify(package_name, base, klassfile.imports) if base != "object" else None)
+             for position, base in enumerate(klass.inheritance)])
+        for position, method in enumerate(klass.methods):
+            method_id = execute(
+                "INSERT INTO methods (class_id, position, name, modifiers, return_type_id, docstr) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (class_id, position, method.java_name, join_modifiers(method.modifiers),
+                 self.type_id(method.return_type), method.docstr)).lastrowid
+            self.connection.executemany(
+                "INSERT INTO parameters (method_id, position, name, type_id) VALUES (?, ?, ?, ?)",
+                [(method_id, parameter_position, parameter.name, self.type_id(parameter.type))
+                 for parameter_position, parameter in enumerate(method.parameters)])
+        self.connection.executemany(
+            "INSERT INTO constants (class_id, position, name, value, type_id, docstr) VALUES (?, ?, ?, ?, ?, ?)",
+            [(class_id, position, constant.name, constant.value, self.type_id(constant.type), constant.docstr)
+             for position, constant in enumerate(klass.constants)])
+
+    def close(self, outputs: Union[OutputFiles, None] = None):
+        """
+        Complete the index and move it into place
+        :param outputs: OutputFiles to write through, an unchanged index is left untouched
+        """
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+        self.connection.close()
+        (outputs if outputs is not None else OutputFiles()).replace(self.filename, self.tmp_filename)
+
+    def abort(self):
+        self.connection.close()
+        os.remove(self.tmp_filename)
+
+
+class ApiIndex(object):
+    """
+    Api index opened as a source provider, in place of a DirectorySource or ArchiveSource
+
+    Classes are loaded as the KlassFile models parsing their sources produced, nothing is parsed.
+    """
+    def __init__(self, filename: str, mmap_size: int = 2 ** 28):
+        """
+        :param mmap_size: bytes of the database file that are memory mapped
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(f"file:{os.path.abspath(filename)}?mode=ro", uri=True)
+        self.connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        try:
+            meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        except sqlite3.DatabaseError as exception:
+            self.connection.close()
+            raise ValueError(f"{filename} is not an api index: {exception}")
+        if meta.get("format") != INDEX_FORMAT or meta.get("generator") != GENERATOR_VERSION:
+            self.connection.close()
+            raise ValueError(f"{filename} was written by another version of java2py (index format "
+                             f"{meta.get('format')}, generator {meta.get('generator')}), write it again")
+        self._types = None  # type: Union[Dict[int, Type], None]
+
+    def packages(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        :return: iterator of (package name, class names), in the listing order of the indexed sources
+        """
+        package_names = {}  # type: Dict[int, str]
+        class_names = {}  # type: Dict[str, List[str]]
+        for package_id, package_name in self.connection.execute("SELECT id, name FROM packages ORDER BY id"):
+            package_names[package_id] = package_name
+            class_names[package_name] = []
+        for package_id, file_name in self.connection.execute("SELECT package_id, file_name FROM classes ORDER BY id"):
+            class_names[package_names[package_id]].append(file_name)
+        return iter(class_names.items())
+
+    def class_names(self, package_name: str) -> List[str]:
+        return [file_name for file_name, in self.connection.execute(
+            "SELECT file_name FROM classes JOIN packages ON packages.id = classes.package_id "
+            "WHERE packages.name = ? ORDER BY classes.id", (package_name,))]
+
+    def listed_packages(self) -> List[str]:
+        """
+        :return: sorted names of the packages with classes that are listed but not indexed
+        """
+        return [package_name for package_name, in self.connection.execute(
+            "SELECT DISTINCT packages.name FROM classes JOIN packages ON packages.id = classes.package_id "
+            "WHERE status = 'listed' ORDER BY packages.name")]
+
+    def class_row(self, package_name: str, klass_name: str) -> tuple:
+        row = self.connection.execute(
+            "SELECT classes.id, status, source_digest, classes.name, modifiers, docstr, file_docstr FROM classes "
+            "JOIN packages ON packages.id = classes.package_id WHERE packages.name = ? AND file_name = ?",
+            (package_name, klass_name)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Could not find class {package_name}.{klass_name} in {self.filename}")
+        return row
+
+    def source_digest(self, package_name: str, klass_name: str) -> str:
+        """
+        :return: source_digest of the source the class was indexed from
+        """
+        _, status, digest, *_ = self.class_row(package_name, klass_name)
+        if status == "listed":
+            raise LookupError(f"Class {package_name}.{klass_name} is listed but not indexed in {self.filename}")
+        return digest
+
+    @property
+    def types(self) -> Dict[int, Type]:
+        """
+        Every interned type by id, loaded once
+        """
+        if self._types is None:
+            types = {}  # type: Dict[int, Type]
+            # type arguments are interned ahead of the types using them
+            for type_id, name, basic, dimensions, has_arguments, argument_id in self.connection.execute(
+                    "SELECT id, name, basic, dimensions, has_arguments, argument_id FROM types ORDER BY id"):
+                types[type_id] = Type(name, bool(basic), (None,) * dimensions, bool(has_arguments),
+                                      types[argument_id] if argument_id is not None else None)
+            self._types = types
+        return self._types
+
+    def load_class(self, package_name: str, klass_name: str) -> Union[KlassFile, None]:
+        """
+        :return: KlassFile as it was indexed, None if its source could not be parsed
+        :raises LookupError: the class is listed but not indexed
+        """
+        class_id, status, _, name, modifiers, docstr, file_docstr = self.class_row(package_name, klass_name)
+        if status == "listed":
+            raise LookupError(f"Class {package_name}.{klass_name} is listed but not indexed in {self.filename}")
+        if status == "error":
+            return None
+        execute = self.connection.execute
+        imports = tuple(Import(path, bool(static), bool(wildcard)) for path, static, wildcard in execute(
+            "SELECT path, static, wildcard FROM imports WHERE class_id = ? ORDER BY position", (class_id,)))
+        if name is None:
+            return KlassFile(klass_name, imports, None, file_docstr)
+
+        types = self.types
+        parameters = {}  # type: Dict[int, List[Parameter]]
+        for method_id, parameter_name, type_id in execute(
+                "SELECT method_id, parameters.name, type_id FROM parameters "
+                "JOIN methods ON methods.id = parameters.method_id WHERE class_id = ? "
+                "ORDER BY method_id, parameters.position", (class_id,)):
+            parameters.setdefault(method_id, []).append(Parameter(parameter_name, types.get(type_id)))
+        methods = []
+        for method_id, method_name, method_modifiers, return_type_id, method_docstr in execute(
+                "SELECT id, name, modifiers, return_type_id, docstr FROM methods WHERE class_id = ? "
+                "ORDER BY position", (class_id,)):
+            method_parameters = tuple(parameters.get(method_id, ()))
+            methods.append(Method(Method.python_method_name(method_name), split_modifiers(method_modifiers),
+                                  types.get(return_type_id), method_parameters,
+                                  Method.python_parameter_names(method_parameters), method_docstr, method_name))
+        constants = tuple(Constant(constant_name, value, types.get(type_id), constant_docstr)
+                          for constant_name, value, type_id, constant_docstr in execute(
+            "SELECT name, value, type_id, docstr FROM constants WHERE class_id = ? ORDER BY position", (class_id,)))
+        inheritance = tuple(base for base, in execute(
+            "SELECT base FROM inheritance WHERE class_id = ? ORDER BY position", (class_id,)))
+        klass = Klass(name, split_modifiers(modifiers), tuple(methods), constants, inheritance, docstr)
+        return KlassFile(klass_name, imports, klass, file_docstr)
+
+    def close(self):
+        self.connection.close()
+
+    def __str__(self):
+        return self.filename
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from typing import Callable, Dict, Tuple, Union
+
+from common import GENERATOR_VERSION
+from klass import KlassFile
+from profiling import profiler
+
+
+class DiskCache(object):
+    """
+    Persistent cache of parsed class files
+
+    Entries are keyed by class name and a hash of the source, and stored below a directory named after the
+    generator and javalang versions and the parse mode, so upgrading either starts from an empty cache.
+    """
+    def __init__(self, cache_dir: str, fast: bool = False):
+        self.cache_dir = os.path.join(cache_dir, self.version_tag(fast))
+
+    @staticmethod
+    def version_tag(fast: bool = False) -> str:
+        try:
+            javalang_version = metadata.version("javalang")
+        except metadata.PackageNotFoundError:
+            javalang_version = "unknown"
+        mode = "-fast" if fast else ""
+        return f"java2py-{GENERATOR_VERSION}-javalang-{javalang_version}{mode}"
+
+    def path(self, klass_name: str, source: str) -> str:
+        digest = hashlib.sha1(klass_name.encode("utf-8") + b"\0" + source.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".pickle")
+
+    def load(self, klass_name: str, source: str) -> Union[KlassFile, None]:
+        """
+        Load cached class file for source
+        :param klass_name: class name
+        :param source: java source of the class file
+        :return: KlassFile or None on cache miss
+        """
+        try:
+            with open(self.path(klass_name, source), "rb") as fp:
+                klassfile = pickle.load(fp)
+            profiler.count("disk_cache.hit")
+            return klassfile
+        except FileNotFoundError:
+            profiler.count("disk_cache.miss")
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as exception:
+            sys.stderr.write(f"ignoring unreadable cache entry for class {klass_name}: {exception}\n")
+            return None
+
+    def store(self, klass_name: str, source: str, klassfile: KlassFile):
+        """
+        Store parsed class file, written to a temporary file first so concurrent runs never see partial entries
+        """
+        filename = self.path(klass_name, source)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "wb") as fp:
+            pickle.dump(klassfile, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+
+class ParseCache(object):
+    """
+    Run-scoped cache of parsed class files
+
+    Every compilation unit is parsed once per run, and repeated requests return the same KlassFile instance,
+    so the template helper and the type resolver share one parsed tree.
+    Failed parses are cached as well (None) so they are only reported once.
+    With more than one job, packages are parsed ahead of time in a pool of worker processes.
+    With fast set, method bodies are skipped while parsing.
+    """
+    def __init__(self, disk_cache: Union[DiskCache, None] = None, jobs: int = 1, fast: bool = False):
+        self.klassfiles = {}  # type: Dict[Tuple[str, str], Union[KlassFile, None]]
+        self.disk_cache = disk_cache
+        self.jobs = jobs
+        self.fast = fast
+        self.pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None  # type: Union[ProcessPoolExecutor, None]
+
+    def get(self, package_name: str, klass_name: str, parse: Callable[[str], Union[KlassFile, None]]):
+        """
+        Return cached class file, parsing it on first request
+        :param package_name: java package name
+        :param klass_name: class name
+        :param parse: callable that parses class name into a KlassFile
+        :return: KlassFile or None if the class could not be parsed
+        """
+        key = (package_name, klass_name)
+        if key not in self.klassfiles:
+            profiler.count("parse_cache.miss")
+            self.klassfiles[key] = parse(klass_name)
+        else:
+            profiler.count("parse_cache.hit")
+        return self.klassfiles[key]
+
+    def put(self, package_name: str, klass_name: str, klassfile: Union[KlassFile, None]):
+        self.klassfiles[(package_name, klass_name)] = klassfile
+
+    def release(self, package_name: str, klass_name: str):
+        self.klassfiles.pop((package_name, klass_name), None)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __contains__(self, key):
+        return key in self.klassfiles
+
+    def __len__(self):
+        return len(self.klassfiles)
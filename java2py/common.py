@@ -1,73 +1,157 @@
 from __future__ import annotations
 
-from typing import Union, List
+import operator
+from typing import Union, List, Tuple
 import javalang.tree as jtree
 
+# Bump when the generated class model changes, this invalidates persistent parse caches
+GENERATOR_VERSION = "3"
 
-class Import(object):
-    node: jtree.Import
 
-    def __init__(self, node):
-        self.node = node
+class Model(object):
+    """
+    Compact immutable value object
+
+    Subclasses list their fields in __slots__ and assign them once, in slot order, with _assign.
+    Models compare by value, and pickle as (class, field values) so they are cheap to cache and to
+    send between processes. The hash is computed once, models are used as memoization keys.
+    """
+    __slots__ = ("_hash",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        getter = operator.attrgetter(*cls.__slots__)
+        cls._values = (lambda self: getter(self)) if len(cls.__slots__) > 1 else (lambda self: (getter(self),))
+
+    def _assign(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            object.__setattr__(self, slot, value)
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return self.__class__, self._values()
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return type(self) is type(other) and hash(self) == hash(other) and self._values() == other._values()
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            value = hash((type(self), self._values()))
+            object.__setattr__(self, "_hash", value)
+            return value
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Import(Model):
+    __slots__ = ("path", "static", "wildcard")
+
+    def __init__(self, path: str, static: bool = False, wildcard: bool = False):
+        self._assign(path, static, wildcard)
+
+    @classmethod
+    def from_node(cls, node: jtree.Import) -> Import:
+        return cls(node.path, bool(node.static), bool(node.wildcard))
 
     @property
     def package_name(self):
-        if self.node.wildcard:
-            return self.node.path.rstrip(".*")
+        if self.wildcard:
+            return self.path.rstrip(".*")
         else:
             """
             TODO
             This an be a burp.IScannerInsertionPoint.INS_BODY !!!
             Need to talk to package manager to see if there really is a package with this name
             """
-            return self.node.path
+            return self.path
 
     @property
     def python_module(self):
-        if self.node.wildcard:
-            import_name = self.node.path.rstrip(".*")
+        if self.wildcard:
+            import_name = self.path.rstrip(".*")
             return f"{import_name}"
         else:
-            return f"{self.node.path}"
+            return f"{self.path}"
+
+    @property
+    def python_package(self):
+        """
+        Package a stub imports for this import: the package itself for wildcard imports, else the class's package
+        """
+        if self.wildcard:
+            return self.path.rstrip(".*")
+        return self.path.rpartition(".")[0]
+
+    @property
+    def python_name(self):
+        """
+        Class name a single-type import binds, None for wildcard imports
+        """
+        if self.wildcard:
+            return None
+        return self.path.rpartition(".")[2]
 
 
-class Type(object):
-    node: Union[jtree.ReferenceType, jtree.BasicType]
+class Type(Model):
+    __slots__ = ("name", "basic", "dimensions", "has_arguments", "argument")
 
-    def __init__(self, node):
-        assert isinstance(node, jtree.ReferenceType) or isinstance(node, jtree.BasicType)
-        self.node = node
+    def __init__(self, name: str, basic: bool, dimensions: Tuple = (), has_arguments: bool = False,
+                 argument: Union[Type, None] = None):
+        self._assign(name, basic, dimensions, has_arguments, argument)
 
-    @property
-    def name(self):
-        return self.node.name
+    @classmethod
+    def from_node(cls, node: Union[jtree.ReferenceType, jtree.BasicType, None]) -> Union[Type, None]:
+        if node is None:
+            # wildcard type argument (<?>)
+            return None
+        assert isinstance(node, jtree.ReferenceType) or isinstance(node, jtree.BasicType)
+        dimensions = tuple(node.dimensions) if node.dimensions else ()
+        arguments = getattr(node, "arguments", None)
+        if arguments is None:
+            return cls(node.name, isinstance(node, jtree.BasicType), dimensions)
+        argument = cls.from_node(arguments[0].type) if len(arguments) > 0 else None
+        return cls(node.name, isinstance(node, jtree.BasicType), dimensions, True, argument)
 
     def is_basic(self):
         """
         Is type a basic type (int, float, long, ...)
         :return: bool
         """
-        return isinstance(self.node, jtree.BasicType)
+        return self.basic
 
     def is_reference(self):
         """
         Is type a reference to another java class?
         :return: bool
         """
-        return isinstance(self.node, jtree.ReferenceType)
+        return not self.basic
 
     def is_array(self):
         """
         Is the type an type[] array?
         :return: bool
         """
-        return self.node is not None and len(self.node.dimensions) == 1 and self.node.dimensions[0] is None
+        return len(self.dimensions) == 1 and self.dimensions[0] is None
 
     def has_children(self):
-        return hasattr(self.node, "arguments") and self.node.arguments is not None
+        return self.has_arguments
 
     def get_children(self) -> Type:
         if self.has_children():
-            return Type(self.node.arguments[0].children[0])
+            return self.argument
         else:
             raise Exception("Ooops, you forgot to check if this type actually have any children (it dont)")
@@ -1,9 +1,12 @@
+import functools
 import re
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 import bs4
 import html
 
+from profiling import profiler
+
 pattern_block_comment = r"^\/\*+(?P<body>.*?)\*\/$"
 
 re_block = re.compile(pattern_block_comment, re.S)
@@ -44,11 +47,9 @@ class JavaDocumentation(ChainDecoder):
     def remove_double_newlines(self, comment: str):
         """
         remove double newlines - used by absorbing classes
+        Runs of three or more newlines are removed in a single pass
         """
-        old = comment
-        while (new := self.re_double_newlines.sub("",comment)) != old:
-            old = new
-        return new
+        return self.re_double_newlines.sub("", comment)
 
     def cleanup(self, comment: str):
         """
@@ -94,9 +95,12 @@ class JavaDocumentation(ChainDecoder):
         Repeats decoding until no more quotes
         :return: html-unquoted comment
         """
-        old = comment
-        while (unquoted := html.unescape(old)) != old:
+        unquoted = comment
+        while "&" in unquoted:
             old = unquoted
+            unquoted = html.unescape(old)
+            if unquoted == old:
+                break
         return unquoted
 
 class KeyValue(object):
@@ -130,61 +134,201 @@ class ExceptionHint(KeyValue):
     pass
 
 
-class MethodDocumentation(JavaDocumentation):
-    re_params = re.compile(
-        r"@param\s+(?P<parameter_name>[a-zA-Z0-9_]+)\s+(?P<parameter_comment>.*?)(?:(?=\n@)|$)",
-        re.S|re.DOTALL)
-    re_return = re.compile(r"@return\s+(?P<return_comment>.*?)(?:(?=\n@)|$)",re.S|re.DOTALL)
-    re_exception = re.compile(r"@exception\s+(?P<exception>[a-zA-Z0-9]+)\s+(?P<exception_comment>.*?)(?:(?=\n@)|$)",
-                              re.S|re.DOTALL)
+class CommentSegment(object):
+    """
+    Text of a comment up to its next section break (a newline followed by @), with the tags found in it
+    """
+    __slots__ = ("text", "stage", "tags")
+
+    def __init__(self, text: str, stage: int = 0):
+        self.text = text
+        self.stage = stage  # number of TagSections stages applied
+        self.tags = []  # type: List[Tuple[int, str]]
+
+
+class TagSections(object):
+    """
+    Moves the tag sections out of a comment: the comment is tokenized once into segments, which one pass assigns
+    to the sections
+
+    A section runs from its tag to the end of its segment, a tag whose name and whitespace reach the end of the
+    segment takes the next segment as its text. The stages cut parameters, the first return and exceptions, as if
+    each stage cut its tag from the whole comment after the stage before it: a stage looks at the next segment as the
+    earlier stages left it, and a segment cut down to its section break (a lone newline) joins the segment in front
+    of it. Segments are taken through all stages one after the other, the segments after them only as far as the
+    stages need to look ahead.
+    """
+    re_token = re.compile(r"\n(?=@)|@(param|return|exception)")
+    stages = (
+        ("param", re.compile(r"@param\s+(?P<name>[a-zA-Z0-9_]+)(?P<space>\s*)"), None),
+        ("return", re.compile(r"@return(?P<space>\s*)"), 1),
+        ("exception", re.compile(r"@exception\s+(?P<name>[a-zA-Z0-9]+)(?P<space>\s*)"), None),
+    )
+
+    def __init__(self, comment: str):
+        body = comment[:-1] if comment.endswith("\n") else comment
+        self.segments = [CommentSegment("")]
+        start = 0
+        for match in self.re_token.finditer(body):
+            if match.group(1) is None:
+                self.segments[-1].text = body[start:match.start()]
+                start = match.start()
+                self.segments.append(CommentSegment(""))
+            else:
+                self.segments[-1].tags.append((match.start() - start, match.group(1)))
+        self.segments[-1].text = body[start:]
+        if body is not comment:
+            # a final newline is never part of a section's text, but the whitespace after a tag takes it
+            self.segments.append(CommentSegment("\n", len(self.stages)))
+        self.sections = tuple([] for _ in self.stages)  # (name, text) per stage
+
+    def scan(self) -> str:
+        """
+        :return: the comment without the cut sections, which are in sections
+        """
+        index = 0
+        while index < len(self.segments):
+            if self.segments[index].stage < len(self.stages):
+                self.advance(index, len(self.stages))
+            else:
+                index += 1
+        return "".join(segment.text for segment in self.segments)
+
+    def advance(self, index: int, stage: int):
+        """
+        Apply the stages before stage to the segment at index, a segment left as a lone newline joins the one in
+        front of it
+        """
+        segment = self.segments[index]
+        while segment.stage < stage:
+            self.look_ahead(index, segment.stage)
+            self.cut(index, segment.stage)
+            segment.stage += 1
+            if segment.text == "\n" and index == len(self.segments) - 1:
+                segment.stage = len(self.stages)  # the final newline, which no section takes
+            elif segment.text == "\n" and index > 0:
+                self.segments[index - 1].text += "\n"
+                del self.segments[index]
+                return
+
+    def look_ahead(self, index: int, stage: int):
+        """
+        Make the segment after index what stage sees: the earlier stages applied to it and to the segment after it,
+        so lone newlines have joined it
+        """
+        for ahead in (index + 1, index + 2):
+            while ahead < len(self.segments) and self.segments[ahead].stage < stage:
+                self.advance(ahead, stage)
+
+    def cut(self, index: int, stage: int):
+        """
+        Cut the sections of one stage out of the segment at index: the first tag that starts a section, then, as
+        every cut ends the segment where the tag was, the last tag in front of it for as long as that one does
+        """
+        tag, pattern, limit = self.stages[stage]
+        sections = self.sections[stage]
+        if limit is not None and len(sections) >= limit:
+            return
+        segment = self.segments[index]
+        passed = []  # type: List[int]
+        for position, kind in segment.tags:
+            if kind != tag or position >= len(segment.text):
+                continue
+            match = self.match_tag(pattern, index, position)
+            if match is not None:
+                break
+            passed.append(position)
+        else:
+            return
+        while True:
+            text = segment.text
+            if match.end() < len(text):
+                sections.append((match.groupdict().get("name"), text[match.end():]))
+            elif index + 1 < len(self.segments):
+                sections.append((match.groupdict().get("name"), self.segments[index + 1].text[1:]))
+                del self.segments[index + 1]
+                self.look_ahead(index, stage)
+            else:
+                sections.append((match.groupdict().get("name"), ""))
+            segment.text = text[:position]
+            if not passed or (limit is not None and len(sections) >= limit):
+                return
+            position = passed.pop()
+            match = self.match_tag(pattern, index, position)
+            if match is None:
+                return
+
+    def match_tag(self, pattern, index: int, position: int):
+        """
+        :return: the match of the tag's name and whitespace if the tag at position starts a section, else None
+        """
+        match = pattern.match(self.segments[index].text, position)
+        if match is None or match.group("space"):
+            return match
+        # without whitespace of its own, the tag takes the newline of the next section break
+        if match.end() == len(self.segments[index].text) and index + 1 < len(self.segments):
+            return match
+        return None
+
 
+class MethodDocumentation(JavaDocumentation):
+    """
+    Method documentation, with the @param, @return and @exception sections moved out of the description (see
+    TagSections)
+    """
     def __init__(self, docstr):
         super().__init__(docstr)
-        self.add_decoder(self.absorb_params)
-        self.add_decoder(self.absorb_return_type)
-        self.add_decoder(self.absorb_exceptions)
+        self.add_decoder(self.absorb_tags)
         self.add_decoder(self.remove_double_newlines)
 
         self.parameters = []  # type: List[ParamHint]
         self.return_type = None  # type: Optional[ReturnHint,None]
         self.exceptions = []  # type: List[ExceptionHint]
 
-    def absorb_return_type(self, comment):
-        s = comment
-        # Only expect one match
-        #match = self.re_return.match(comment)
-        match = self.re_return.search(comment)
-        if match is not None:
-            return_comment = match.groupdict()["return_comment"]
-            self.return_type = ReturnHint(None, return_comment)
-            s = s[0:match.start()] + s[match.end():]
+    def absorb_tags(self, comment):
+        tag_sections = TagSections(comment)
+        s = tag_sections.scan()
+        params, returns, exceptions = tag_sections.sections
+        self.parameters.extend(ParamHint(name, text) for name, text in params)
+        for _, text in returns:
+            self.return_type = ReturnHint(None, text)
+        self.exceptions.extend(ExceptionHint(name, text) for name, text in exceptions)
         return s
 
-    def absorb_params(self, comment):
-        s = comment
-        while (match := self.re_params.search(s)) != None:
-            param_name = match.groupdict()["parameter_name"]
-            param_comment = match.groupdict()["parameter_comment"]
-            self.parameters.append(ParamHint(param_name, param_comment))
-            s = s[0:match.start()] + s[match.end():]
-        return s
 
-    def absorb_exceptions(self, comment):
-        s = comment
-        while (match := self.re_exception.search(s)) != None:
-            exception = match.groupdict()["exception"]
-            comment = match.groupdict()["exception_comment"]
-            self.exceptions.append(ExceptionHint(exception, comment))
-            s = s[0:match.start()] + s[match.end():]
-        return s
+@functools.lru_cache(maxsize=8192)
+def decode_documentation(javadoc_class, docstr: str) -> JavaDocumentation:
+    """
+    Decode documentation once per distinct comment, the JDK repeats many doc strings verbatim
+    The returned instance is shared and must be treated as read-only
+    :param javadoc_class: JavaDocumentation class to decode with
+    :param docstr: raw comment
+    :return: parsed JavaDocumentation instance
+    """
+    javadoc = javadoc_class(docstr)
+    javadoc.parse()
+    return javadoc
+
+
+profiler.register_cache("docs_cache", decode_documentation)
+
 
 class DocumentationTemplateFacade(object):
-    javadoc_instance = None  # type: JavaDocumentation
     javadoc_class = JavaDocumentation
 
     def __init__(self, docstr):
-        self.javadoc_instance = self.javadoc_class(docstr)
-        self.javadoc_instance.parse()
+        self.docstr = docstr
+        self._javadoc_instance = None  # type: Optional[JavaDocumentation]
+
+    @property
+    def javadoc_instance(self):
+        """
+        Decoded documentation, only decoded once the template actually reads it
+        """
+        if self._javadoc_instance is None:
+            with profiler.phase("docs"):
+                self._javadoc_instance = decode_documentation(self.javadoc_class, self.docstr)
+        return self._javadoc_instance
 
     def __str__(self):
         return self.javadoc_instance.new_docstr
@@ -194,7 +338,6 @@ class DocumentationTemplateFacade(object):
 
 class MethodDocumentationTemplateFacade(DocumentationTemplateFacade):
     javadoc_class = MethodDocumentation
-    javadoc_instance = None  # type: MethodDocumentation
 
     @property
     def parameters(self):
@@ -218,10 +361,87 @@ class ClassDocumentation(JavaDocumentation):
 
 class ClassDocumentationTemplateFacade(DocumentationTemplateFacade):
     javadoc_class = JavaDocumentation
-    javadoc_instance = None  # type: JavaDocumentation
 
 
 class ConstantDocumentation(JavaDocumentation):
     javadoc_class = JavaDocumentation
     javadoc_instance = None  # type: JavaDocumentation
 
+
+class SummaryDocumentation(JavaDocumentation):
+    """
+    Only keeps the first sentence of the description
+    """
+    re_block_tag = re.compile(r"(?:^|\n)[ \t]*@[a-zA-Z]")
+    re_first_sentence = re.compile(r"^\s*(?P<sentence>.*?[.!?])(?=\s|$)", re.S)
+
+    def __init__(self, docstr):
+        super().__init__(docstr)
+        self.add_decoder(self.first_sentence)
+
+    def first_sentence(self, comment):
+        match = self.re_block_tag.search(comment)
+        if match is not None:
+            comment = comment[:match.start()]
+        match = self.re_first_sentence.match(comment)
+        if match is None:
+            return comment.strip()
+        return match.groupdict()["sentence"]
+
+
+class SummaryDocumentationTemplateFacade(DocumentationTemplateFacade):
+    javadoc_class = SummaryDocumentation
+
+
+class MethodSummaryDocumentationTemplateFacade(SummaryDocumentationTemplateFacade):
+    parameters = []  # type: List[ParamHint]
+    return_type = None  # type: Optional[ReturnHint]
+    exceptions = []  # type: List[ExceptionHint]
+
+
+DOCUMENTATION_LEVELS = ("none", "summary", "full")
+
+
+def check_documentation_level(level: str):
+    """
+    none skips documentation, summary keeps the first sentence and full keeps everything
+    """
+    if level not in DOCUMENTATION_LEVELS:
+        raise ValueError(f"Unknown documentation level {level}, expected one of {', '.join(DOCUMENTATION_LEVELS)}")
+
+
+def class_documentation(docstr: Optional[str], level: str = "full") -> Optional[DocumentationTemplateFacade]:
+    """
+    Each level decodes with its own documentation class, so decode_documentation never shares results between levels
+    :param level: documentation level, one of DOCUMENTATION_LEVELS
+    """
+    if level == "none":
+        return None
+    if docstr is None:
+        docstr = ""
+    if level == "summary":
+        return SummaryDocumentationTemplateFacade(docstr)
+    return ClassDocumentationTemplateFacade(docstr)
+
+
+def method_documentation(docstr: Optional[str], level: str = "full") -> Optional[DocumentationTemplateFacade]:
+    if level == "none" or docstr is None:
+        return None
+    if level == "summary":
+        return MethodSummaryDocumentationTemplateFacade(docstr)
+    return MethodDocumentationTemplateFacade(docstr)
+
+
+def documentation_entry(documentation: Optional[DocumentationTemplateFacade]) -> Optional[dict]:
+    """
+    Decoded documentation as plain data, for documentation kept outside of the generated modules
+    :return: {"doc": description, "params": [[name, description], ...], "return": description or None}
+    """
+    if documentation is None:
+        return None
+    return_type = getattr(documentation, "return_type", None)
+    return {
+        "doc": documentation.to_string(),
+        "params": [[param._key, param.value] for param in getattr(documentation, "parameters", [])],
+        "return": return_type.value if return_type is not None else None,
+    }
@@ -0,0 +1,77 @@
+"""
+Documentation resource of slim builds
+
+Slim modules are rendered with signatures only. The documentation of their classes goes to a gzip compressed json
+file next to the module (burp/burp.py -> burp/burp.docs.json.gz), together with the _docs.py helper (docs.txt)
+that reads it on demand:
+
+    {"package": "burp", "level": "full", "classes": {"IHttpService": {"doc": "...", "methods": {"getHost": [
+        {"signature": "(self)", "doc": "...", "params": [], "return": "..."}]}}}}
+
+Methods map to a list of their overloads, undocumented methods are left out.
+"""
+import datetime
+import gzip
+import json
+import os
+from typing import Dict
+
+import doc
+from klass import KlassFile
+from manifest import OutputFiles
+
+RESOURCE_SUFFIX = ".docs.json.gz"
+HELPER_MODULE = "_docs.py"
+
+
+def resource_filename(module_filename: str) -> str:
+    """
+    :param module_filename: module of the package, e.g. burp/burp.py or java/net/__init__.py
+    """
+    return os.path.splitext(module_filename)[0] + RESOURCE_SUFFIX
+
+
+class DocumentationResource(object):
+    def __init__(self, package_name: str, level: str):
+        """
+        :param level: documentation level of the resource, full or summary
+        """
+        self.package_name = package_name
+        self.level = level
+        self.klasses = {}  # type: Dict[str, dict]
+
+    def add(self, klassfile: KlassFile):
+        klass = klassfile.klass
+        if klass is None:
+            return
+        methods = {}
+        for method in klass.methods:
+            entry = doc.documentation_entry(doc.method_documentation(method.docstr, self.level))
+            if entry is None:
+                continue
+            entry["signature"] = f"({', '.join(method.parameter_names)})"
+            methods.setdefault(method.name, []).append(entry)
+        documentation = doc.class_documentation(klass.docstr, self.level)
+        self.klasses[klass.name] = {
+            "doc": documentation.to_string() if documentation is not None else None,
+            "methods": methods,
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        Compressed resource, identical for identical documentation so unchanged resources are not rewritten
+        """
+        resource = {"package": self.package_name, "level": self.level, "classes": self.klasses}
+        data = json.dumps(resource, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return gzip.compress(data, mtime=0)
+
+    def write(self, outputs: OutputFiles, module_filename: str, environment):
+        """
+        Write resource and the _docs.py helper next to the module
+        :param environment: jinja environment or Emitter rendering docs.txt
+        """
+        with outputs.open(resource_filename(module_filename), binary=True) as fp:
+            fp.write(self.to_bytes())
+        with outputs.open(os.path.join(os.path.dirname(module_filename), HELPER_MODULE)) as fp:
+            environment.get_template("docs.txt").stream(now=datetime.datetime.utcnow).dump(fp)
+            fp.write("\n")
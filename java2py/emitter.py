@@ -0,0 +1,477 @@
+"""
+Direct code emitter, writes the modules of the stock templates straight from the class model
+
+Stands in for the jinja environment of PackageRenderer: get_template hands out templates with the same render and
+stream(...).dump interface, but the text is built with plain string joins instead of jinja's runtime. Types are
+resolved once per use, documentation is decoded once per method, and wrapped and indented doc strings are cached.
+
+The output is byte for byte what jinja renders from templates/ (see benchmarks/golden.py). TEMPLATES_DIGEST is the
+digest of the templates the emitter was written against, templates that differ from them are rendered with jinja.
+"""
+import functools
+import hashlib
+import os
+import re
+import textwrap
+from typing import Callable, Iterable, Iterator, List, Union
+
+from common import Import
+from klass import KlassFile
+from profiling import profiler
+
+EMITTED_TEMPLATES = ("class.txt", "docs.txt", "header.txt", "init.txt", "klass.txt", "module.txt", "stub.txt",
+                     "stub_header.txt", "stub_klass.txt")
+TEMPLATES_DIGEST = "a576d8898139407eb7a81574cc6dfaaac53741cd36ab05edd3764ed6217f6153"
+
+HEADER = """\
+from __future__ import absolute_import
+try:
+    from typing import List, Union, Optional
+    from array import array
+except ImportError:
+    pass
+"""
+
+STUB_HEADER = """\
+from typing import Any as _Any, List as _List, overload
+from array import array
+"""
+
+INIT_HEADER = """\
+from __future__ import absolute_import
+import sys
+from types import ModuleType
+
+__all__ = [
+"""
+
+INIT_FOOTER = """\
+]
+
+
+class _LazyModule(ModuleType):
+    \"\"\"
+    Imports the module of a class (_ClassName) on first attribute access
+    Replaces this package in sys.modules, which works on python 2, jython and python 3
+    \"\"\"
+    def __getattr__(self, name):
+        if name.startswith("__") or name not in self.__all__:
+            raise AttributeError("module %r has no attribute %r" % (self.__name__, name))
+        module = __import__(self.__name__ + "._" + name, fromlist=[name])
+        value = getattr(module, name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(list(self.__dict__.keys()) + list(self.__all__)))
+
+
+_lazy_module = _LazyModule(__name__)
+_lazy_module.__dict__.update(sys.modules[__name__].__dict__)
+# keep the original module alive, python 2 clears the globals of collected modules
+_lazy_module._original_module = sys.modules[__name__]
+sys.modules[__name__] = _lazy_module"""
+
+
+DOCS_HELPER = r'''"""
+Documentation of the classes of a slim build
+
+Slim modules only hold signatures, their documentation is kept in a compressed resource next to the module
+(<module>.docs.json.gz) that is only read when documentation is asked for:
+
+    from burp._docs import help
+    help(IBurpExtenderCallbacks.makeHttpRequest)
+    help("burp.IHttpService")
+"""
+from __future__ import print_function
+import glob
+import gzip
+import json
+import os
+import sys
+
+RESOURCE_SUFFIX = ".docs.json.gz"
+
+_resources = {}
+
+
+def _load(filename):
+    if filename not in _resources:
+        fp = gzip.open(filename, "rb")
+        try:
+            _resources[filename] = json.loads(fp.read().decode("utf-8"))
+        finally:
+            fp.close()
+    return _resources[filename]
+
+
+def _directory_resources(directory):
+    return [_load(filename) for filename in sorted(glob.glob(os.path.join(directory, "*" + RESOURCE_SUFFIX)))]
+
+
+def _module_directory(module_name):
+    module = sys.modules.get(module_name)
+    filename = getattr(module, "__file__", None)
+    if filename is None:
+        return None
+    return os.path.dirname(os.path.abspath(filename))
+
+
+def _find(resources, klass_name, method_name):
+    for resource in resources:
+        klass = resource["classes"].get(klass_name)
+        if klass is None:
+            continue
+        if method_name is None:
+            return klass
+        return klass["methods"].get(method_name)
+    return None
+
+
+def lookup(obj):
+    """
+    Documentation of a class or method
+    :param obj: generated class or method, or qualified java name such as "burp.IHttpService.getHost"
+    :return: {"doc", "methods"} of a class, a list of {"signature", "doc", "params", "return"} for the overloads
+             of a method, or None
+    """
+    if isinstance(obj, str):
+        here = os.path.dirname(os.path.abspath(__file__))
+        for resource in _directory_resources(here):
+            prefix = resource["package"] + "."
+            if obj.startswith(prefix):
+                klass_name, _, method_name = obj[len(prefix):].partition(".")
+                return _find([resource], klass_name, method_name or None)
+        return None
+    if isinstance(obj, type):
+        klass, method_name = obj, None
+    else:
+        # unbound methods on python 2 and jython, functions on python 3
+        function = getattr(obj, "__func__", obj)
+        klass = getattr(obj, "im_class", None)
+        method_name = function.__name__
+        if klass is None:
+            klass_name = getattr(function, "__qualname__", "").rpartition(".")[0]
+            directory = _module_directory(function.__module__)
+            if directory is None or klass_name == "":
+                return None
+            return _find(_directory_resources(directory), klass_name, method_name)
+    directory = _module_directory(klass.__module__)
+    if directory is None:
+        return None
+    return _find(_directory_resources(directory), klass.__name__, method_name)
+
+
+def _format(entry):
+    lines = []
+    if entry.get("doc"):
+        lines.append(entry["doc"])
+    for name, value in entry.get("params", []):
+        lines.append(":param %s: %s" % (name, value))
+    if entry.get("return") is not None:
+        lines.append(":return: %s" % entry["return"])
+    return "\n".join(lines)
+
+
+def doc(obj):
+    """
+    :return: documentation of a class or method as text, empty when there is none
+    """
+    entry = lookup(obj)
+    if entry is None:
+        return ""
+    if isinstance(entry, list):
+        return "\n\n".join("%s\n%s" % (overload["signature"], _format(overload)) for overload in entry)
+    return _format(entry)
+
+
+def help(obj):
+    """
+    Print documentation of a class or method
+    """
+    print(doc(obj))'''
+
+# textwrap's chunks of a line without hyphens
+re_chunks = re.compile(r"[\t\n\x0b\x0c\r ]+|[^\t\n\x0b\x0c\r ]+")
+
+
+def templates_digest(template_dir: str) -> Union[str, None]:
+    """
+    :return: digest of the emitted templates in template_dir, None when one of them is missing
+    """
+    digest = hashlib.sha256()
+    for name in EMITTED_TEMPLATES:
+        try:
+            with open(os.path.join(template_dir, name), "rb") as fp:
+                digest.update(name.encode("utf-8") + b"\0" + fp.read() + b"\0")
+        except FileNotFoundError:
+            return None
+    return digest.hexdigest()
+
+
+def emits_templates(template_dir: str) -> bool:
+    """
+    Are the templates in template_dir the ones the emitter reproduces
+    """
+    return templates_digest(template_dir) == TEMPLATES_DIGEST
+
+
+def indent(text: str, width: int) -> str:
+    """
+    jinja's indent filter: indent every line but the first, blank lines stay empty
+    """
+    lines = (text + "\n").splitlines()
+    if len(lines) == 1:
+        return lines[0]
+    indention = " " * width
+    return lines[0] + "\n" + "\n".join(indention + line if line else line for line in lines[1:])
+
+
+@functools.lru_cache(maxsize=None)
+def text_wrapper(width: int) -> textwrap.TextWrapper:
+    return textwrap.TextWrapper(width=width, expand_tabs=False, replace_whitespace=False)
+
+
+def wrap_words(line: str, width: int) -> List[str]:
+    """
+    textwrap's greedy line filling for lines without hyphens, which textwrap splits into whitespace and word chunks
+    Skips textwrap's chunking expression, which spends most of its time looking for hyphenated words.
+    """
+    chunks = re_chunks.findall(line)
+    chunks.reverse()
+    lines = []
+    while len(chunks) > 0:
+        current = []
+        length = 0
+        if len(lines) > 0 and chunks[-1].strip() == "":
+            del chunks[-1]
+        while len(chunks) > 0 and length + len(chunks[-1]) <= width:
+            length += len(chunks[-1])
+            current.append(chunks.pop())
+        if len(chunks) > 0 and len(chunks[-1]) > width:
+            # break long word
+            chunk = chunks[-1]
+            current.append(chunk[:width - length])
+            chunks[-1] = chunk[width - length:]
+        if len(current) > 0 and current[-1].strip() == "":
+            del current[-1]
+        if len(current) > 0:
+            lines.append("".join(current))
+    return lines
+
+
+@functools.lru_cache(maxsize=8192)
+def wrap_indent(text: str, width: int, indent_width: int) -> str:
+    """
+    jinja's wordwrap(width) followed by indent(indent_width), cached as the JDK repeats many doc strings
+    A line that fits and does not end in whitespace is what textwrap returns for it, only longer lines are wrapped.
+    """
+    lines = []
+    for line in text.splitlines():
+        if len(line) <= width and not line[-1:].isspace():
+            lines.append(line)
+        elif "-" not in line:
+            lines.append("\n".join(wrap_words(line, width)))
+        else:
+            lines.append("\n".join(text_wrapper(width).wrap(line)))
+    return indent("\n".join(lines), indent_width)
+
+
+profiler.register_cache("wrap_cache", wrap_indent)
+
+
+def unique_modules(imports: Iterable[Import]) -> List[str]:
+    """
+    python modules of the imports, in order of first occurrence and ignoring case like jinja's unique filter
+    """
+    modules = []
+    seen = set()
+    for imp in imports:
+        module = imp.python_module
+        key = module.lower()
+        if key not in seen:
+            seen.add(key)
+            modules.append(module)
+    return modules
+
+
+class EmittedStream(object):
+    def __init__(self, chunks: Iterator[str]):
+        self.chunks = chunks
+
+    def dump(self, fp):
+        for chunk in self.chunks:
+            fp.write(chunk)
+
+
+class EmittedTemplate(object):
+    """
+    Template interface (render, generate, stream) over an emitter function yielding chunks of text
+    """
+    def __init__(self, emit: Callable[..., Iterator[str]]):
+        self.emit = emit
+
+    def generate(self, **context) -> Iterator[str]:
+        return self.emit(**context)
+
+    def render(self, **context) -> str:
+        return "".join(self.emit(**context))
+
+    def stream(self, **context) -> EmittedStream:
+        return EmittedStream(self.emit(**context))
+
+
+class Emitter(object):
+    def __init__(self, type_resolver):
+        """
+        :param type_resolver: TypeResolver of the run
+        """
+        self.resolve_type = profiler.wrap("resolve", type_resolver.resolve_type)
+        self.python_resolve = profiler.wrap("resolve", type_resolver.python_resolve)
+        self.stub_resolve = profiler.wrap("resolve", type_resolver.stub_resolve)
+        self.stub_bases = profiler.wrap("resolve", type_resolver.stub_bases)
+        self.stub_methods = profiler.wrap("resolve", type_resolver.stub_methods)
+        self.stub_imports = profiler.wrap("resolve", type_resolver.stub_imports)
+        self.stub_modules = profiler.wrap("resolve", type_resolver.stub_modules)
+        self.templates = {
+            "class.txt": EmittedTemplate(self.emit_package),
+            "docs.txt": EmittedTemplate(self.emit_docs),
+            "header.txt": EmittedTemplate(self.emit_header),
+            "init.txt": EmittedTemplate(self.emit_init),
+            "klass.txt": EmittedTemplate(self.emit_klass),
+            "module.txt": EmittedTemplate(self.emit_module),
+            "stub.txt": EmittedTemplate(self.emit_stub),
+            "stub_header.txt": EmittedTemplate(self.emit_stub_header),
+            "stub_klass.txt": EmittedTemplate(self.emit_stub_klass),
+        }
+
+    def get_template(self, name: str) -> EmittedTemplate:
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise ValueError(f"no emitter for template {name}, render it with jinja") from None
+
+    def emit_package(self, package, now, docs: str = "full") -> Iterator[str]:
+        """
+        class.txt: header, a blank line and every class
+        :param docs: documentation level
+        """
+        yield from self.emit_header(package.imports, now)
+        yield "\n\n"
+        for klassfile in package.klasses:
+            yield self.klass(klassfile, docs)
+
+    def emit_docs(self, now) -> Iterator[str]:
+        """
+        docs.txt: helper reading the documentation resources of slim builds
+        """
+        yield f"# Autogenerated {now()}\n"
+        yield DOCS_HELPER
+
+    def emit_header(self, imports: Iterable[Import], now) -> Iterator[str]:
+        parts = [f"# Autogenerated {now()}\n", HEADER]
+        for module in unique_modules(imports):
+            parts.append(f"try:\n    import {module}\nexcept ImportError:\n    pass\n")
+        yield "".join(parts)
+
+    def emit_klass(self, klassfile: KlassFile, docs: str = "full") -> Iterator[str]:
+        yield self.klass(klassfile, docs)
+
+    def klass(self, klassfile: KlassFile, docs: str = "full") -> str:
+        """
+        klass.txt
+        :param docs: documentation level
+        """
+        klass = klassfile.klass
+        if klass is None:
+            return ""
+        python_resolve = self.python_resolve
+        parts = [f"class {klass.name}({', '.join([self.resolve_type(base) for base in klass.inheritance])}):\n    "]
+        documentation = klass.documentation_at(docs)
+        if documentation is not None:
+            parts.append(f'"""\n    {indent(documentation.to_string(), 4)}\n    """\n    ')
+        elif not klass.constants and not klass.methods:
+            parts.append("pass\n    ")
+        for constant in klass.constants:
+            parts.append(f"{constant.name} = {constant.value}  # type: {python_resolve(constant.type)}\n    ")
+        parts.append("\n    ")
+        for method in klass.methods:
+            parameter_types = ", ".join([python_resolve(parameter.type) for parameter in method.parameters])
+            parts.append(f"def {method.name}({', '.join(method.parameter_names)}):\n"
+                         f"        # type: ({parameter_types}) -> {python_resolve(method.return_type, klassfile)}\n"
+                         f"        ")
+            documentation = method.documentation_at(docs)
+            if documentation is not None:
+                parts.append(f'"""\n        {wrap_indent(documentation.to_string(), 60, 8)}\n        ')
+                for param in documentation.parameters:
+                    # jinja renders attributes that fail to resolve as empty, ParamHint.name does for now
+                    name = getattr(param, "name", "")
+                    parts.append(f":param:    {name}    {wrap_indent(param.value, 50, 8)}\n        ")
+                if documentation.return_type is not None:
+                    parts.append(f"\n        :return: {wrap_indent(documentation.return_type.value, 60, 8)}\n        ")
+                parts.append('"""\n        ')
+            parts.append("pass\n\n    ")
+        parts.append("\n")
+        return "".join(parts)
+
+    def emit_module(self, package, klassfile: KlassFile, now, docs: str = "full") -> Iterator[str]:
+        """
+        module.txt: header with the imports of the class, imports of base classes in the package and the class
+        """
+        yield from self.emit_header(klassfile.imports, now)
+        parts = ["\n"]
+        if len(klassfile.klass.inheritance) > 0:
+            klass_names = package.klass_names
+            for base in klassfile.klass.inheritance:
+                if base in klass_names:
+                    parts.append(f"from . import {base}\n")
+        parts.append("\n\n")
+        yield "".join(parts)
+        yield self.klass(klassfile, docs)
+
+    def emit_init(self, klass_names: List[str], now) -> Iterator[str]:
+        parts = [f"# Autogenerated {now()}\n", INIT_HEADER]
+        for name in klass_names:
+            parts.append(f'    "{name}",\n')
+        parts.append(INIT_FOOTER)
+        yield "".join(parts)
+
+    def emit_stub(self, package, now, docs: str = "full") -> Iterator[str]:
+        """
+        stub.txt: stubs hold no documentation, docs is accepted like the other package templates take it
+        """
+        body = "".join(self.stub_klass(klassfile) for klassfile in package.klasses)
+        yield from self.emit_stub_header(package, package.imports, body, now)
+        yield body
+
+    def emit_stub_header(self, package, imports: Iterable[Import], body: str, now) -> Iterator[str]:
+        """
+        stub_header.txt: imports what the class definitions (body) refer to
+        """
+        parts = [f"# Autogenerated {now()}\n", STUB_HEADER]
+        for module in self.stub_modules(body):
+            parts.append(f"import {module}\n")
+        for imp in self.stub_imports(imports, package.klass_names):
+            parts.append(f"from {imp.python_package} import {imp.python_name}\n")
+        yield "".join(parts)
+
+    def emit_stub_klass(self, klassfile: KlassFile) -> Iterator[str]:
+        yield self.stub_klass(klassfile)
+
+    def stub_klass(self, klassfile: KlassFile) -> str:
+        """
+        stub_klass.txt
+        """
+        klass = klassfile.klass
+        if klass is None:
+            return ""
+        parts = [f"\n\nclass {klass.name}({', '.join(self.stub_bases(klassfile))}):\n"]
+        for constant in klass.constants:
+            parts.append(f"    {constant.name}: {self.stub_resolve(constant.type, klassfile)}\n")
+        for method in self.stub_methods(klassfile):
+            if method.overload:
+                parts.append("    @overload\n")
+            parts.append(f"    def {method.name}({method.parameters}) -> {method.return_type}: ...\n")
+        if not klass.constants and not klass.methods:
+            parts.append("    ...\n")
+        return "".join(parts)
@@ -0,0 +1,116 @@
+import re
+
+import javalang.parse
+import javalang.tree as jtree
+
+# tokens that matter for finding declarations, operators containing "=" are listed so they are not taken for "="
+re_declaration_token = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<literal>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    |(?P<word>[A-Za-z_$][\w$]*)
+    |(?P<operator>==|!=|<=|>=|[-+*/%&|^]=)
+    |(?P<separator>[{}();,=.])
+    """, re.S | re.X)
+# inside a block only braces count, comments and literals are matched so their braces are skipped
+re_block_token = re.compile(r"""//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|[{}]""", re.S)
+
+type_keywords = ("class", "interface", "enum")
+
+
+def matching_brace(source: str, start: int) -> int:
+    """
+    :param start: position of an opening brace
+    :return: position of the matching closing brace
+    """
+    depth = 0
+    for match in re_block_token.finditer(source, start):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return match.start()
+    raise ValueError("unbalanced braces")
+
+
+def strip_bodies(source: str) -> str:
+    """
+    Remove the contents of method, constructor and initializer bodies, keeping their braces
+
+    Type bodies are followed member by member: a brace at parenthesis depth 0 opens a nested type body when the
+    member declares a class, interface or enum, belongs to an expression when the member has an initializer
+    (field initializers, annotation defaults), and is a body block otherwise. Enum constants may have class
+    bodies of their own. Everything outside of bodies, javadoc comments included, is kept as is.
+    """
+    pieces = []
+    kept = 0
+    # kinds of the enclosing type bodies, "enum" while in the constants section of an enum
+    contexts = ["unit"]
+    depth = 0
+    initializer = False
+    declared_type = None
+    previous = None
+    position = 0
+    while True:
+        match = re_declaration_token.search(source, position)
+        if match is None:
+            break
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("comment", "literal"):
+            continue
+        token = match.group()
+        if kind == "separator":
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+            elif depth == 0 and token == ";":
+                initializer = False
+                declared_type = None
+                if contexts[-1] == "enum":
+                    contexts[-1] = "type"
+            elif depth == 0 and token == "," and contexts[-1] == "enum":
+                initializer = False
+            elif depth == 0 and token == "{":
+                if declared_type is not None or (contexts[-1] == "enum" and not initializer):
+                    contexts.append("enum" if declared_type == "enum" else "type")
+                    initializer = False
+                    declared_type = None
+                else:
+                    end = matching_brace(source, match.start())
+                    if not initializer and contexts[-1] != "unit":
+                        # body block, drop everything between the braces
+                        pieces.append(source[kept:match.end()])
+                        kept = end
+                        declared_type = None
+                    position = end + 1
+                    token = "}"
+            elif depth == 0 and token == "}":
+                contexts.pop()
+                if len(contexts) == 0:
+                    raise ValueError("unbalanced braces")
+                initializer = False
+                declared_type = None
+            elif depth == 0 and token == "=" and not initializer:
+                initializer = True
+        elif depth == 0 and kind == "word" and not initializer:
+            if token == "default" and previous == ")":
+                # annotation element default value
+                initializer = True
+            elif token in type_keywords and previous != ".":
+                declared_type = token
+        previous = token
+    if depth != 0 or contexts != ["unit"]:
+        raise ValueError("unbalanced parentheses or braces")
+    pieces.append(source[kept:])
+    return "".join(pieces)
+
+
+def parse_signatures(source: str) -> jtree.CompilationUnit:
+    """
+    Parse declarations only, method and initializer bodies are parsed as empty blocks
+    :raises ValueError, javalang.parser.JavaSyntaxError, javalang.tokenizer.LexerError: source could not be parsed
+    """
+    return javalang.parse.parse(strip_bodies(source))
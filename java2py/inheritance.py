@@ -0,0 +1,78 @@
+import sys
+from typing import Dict, List, Tuple
+
+from klass import KlassFile
+from symbols import SymbolIndex
+
+
+class InheritanceGraph(object):
+    """
+    Classes and the base classes they extend, keyed by fully qualified name
+
+    Base classes are resolved through the symbol index, so a class is never mistaken for a base class of the
+    same simple name in another package, and classes of several packages can share one graph.
+    """
+    def __init__(self, symbols: SymbolIndex):
+        self.symbols = symbols
+        self.klassfiles = {}  # type: Dict[str, KlassFile]
+        self.bases = {}  # type: Dict[str, Tuple[str, ...]]
+
+    def add(self, package_name: str, klassfile: KlassFile):
+        qualified_name = package_name + "." + klassfile.klass.name
+        bases = []
+        for base in klassfile.klass.inheritance:
+            if base == "object":
+                continue
+            qualified_base = self.symbols.qualify(package_name, base, klassfile.imports)
+            if qualified_base is None:
+                continue
+            bases.append(qualified_base)
+        self.klassfiles[qualified_name] = klassfile
+        self.bases[qualified_name] = tuple(bases)
+
+    def order(self) -> List[KlassFile]:
+        """
+        Class files with every base class ahead of the classes extending it
+
+        Depth first over the classes sorted by name, so the order does not depend on directory listing order,
+        and every class and edge is visited once (O(V+E) after sorting).
+        Cycles are reported and broken, base classes that are expected in the graph but missing are reported.
+        """
+        ordered = []  # type: List[KlassFile]
+        state = {}  # type: Dict[str, int]
+        visiting, done = 1, 2
+        for root in sorted(self.klassfiles):
+            if root in state:
+                continue
+            state[root] = visiting
+            stack = [(root, iter(self.bases[root]))]
+            while len(stack) > 0:
+                qualified_name, bases = stack[-1]
+                for base in bases:
+                    if base not in self.klassfiles:
+                        self.check_missing(qualified_name, base)
+                        continue
+                    if state.get(base) == visiting:
+                        names = [name for name, _ in stack]
+                        cycle = names[names.index(base):] + [base]
+                        sys.stderr.write(f"inheritance cycle {' -> '.join(cycle)}, "
+                                         f"{qualified_name} is emitted before {base}\n")
+                        continue
+                    if base not in state:
+                        state[base] = visiting
+                        stack.append((base, iter(self.bases[base])))
+                        break
+                else:
+                    stack.pop()
+                    state[qualified_name] = done
+                    ordered.append(self.klassfiles[qualified_name])
+        return ordered
+
+    def check_missing(self, qualified_name: str, base: str):
+        """
+        Report a base class of the same package that is part of the source tree but was not added to the graph,
+        usually because it could not be parsed
+        """
+        package_name, _, klass_name = base.rpartition(".")
+        if package_name == qualified_name.rpartition(".")[0] and self.symbols.has_class(package_name, klass_name):
+            sys.stderr.write(f"base class {base} of {qualified_name} is missing, {qualified_name} is emitted without it\n")
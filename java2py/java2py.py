@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import collections
 import datetime
-from typing import Union, List
+import functools
+import re
+from typing import Union, Iterable, List, Iterator, Set, Tuple, TextIO
 from common import Type
 from klass import KlassFile
 from package import Package, PackageTemplateHelper
+from cache import DiskCache, ParseCache
+from symbols import SymbolIndex
+from sources import DirectorySource, open_source
+import doc
+from profiling import profiler
+from manifest import BuildManifest, OutputFiles
+from emitter import Emitter, emits_templates
+from docresource import DocumentationResource
+from apiindex import ApiIndex, ApiIndexWriter, is_index
+from memory import MemoryLimitExceeded, MemoryMonitor
 import javalang.tree as jtree
 from common import Import
 import os
+import shutil
+import sys
+import tempfile
 import jinja2
 
 
@@ -45,35 +61,95 @@ class TypeResolver(object):
     Resolve a java type to a python annotated type
 
     Needs to be created in context of a class to determine its imports
+    Results are memoized on the type (Type models compare by value) and the imports of the class file,
+    in bounded caches, so a package costs about one resolution per distinct type.
     """
-    def __init__(self, j2p: JavaToPython):
+    basic_types = {
+        "int": "java.lang.Int",
+        "byte": "java.lang.Byte",
+        "boolean": "java.lang.Boolean",
+        "char": "java.lang.Char",
+        "double": "java.lang.Double",
+        "float": "java.lang.Float",
+        "long": "java.lang.Long",
+        "short": "java.lang.Short"
+    }
+
+    # Based on https://www.jython.org/jython-old-sites/archive/22/userguide.html
+    python_equivalents = {
+        "java.lang.String": "str",
+        "List[java.lang.Byte]": "array",
+        "java.lang.Int": "int",
+        "java.lang.Double": "float",
+        "java.lang.Short": "int",
+        "java.lang.Float": "float",
+        "java.lang.List": "list",
+        "java.lang.Byte": "int",
+        "java.lang.Char": "str",
+        "java.lang.Boolean": "bool"  # This have to be ok...
+    }
+
+    default_imports = ("java.lang.*",)
+
+    # Stubs are checked, so boxed primitives python_equivalents leaves qualified become builtins as well
+    stub_equivalents = {
+        "java.lang.Int": "int",
+        "java.lang.Integer": "int",
+        "java.lang.Long": "int",
+        "java.lang.Short": "int",
+        "java.lang.Byte": "int",
+        "java.lang.Double": "float",
+        "java.lang.Float": "float",
+        "java.lang.Char": "str",
+        "java.lang.Character": "str",
+        "java.lang.Boolean": "bool",
+        "java.lang.String": "str",
+    }
+    # java.lang classes referenced by simple name, when they are not part of the source tree
+    stub_java_lang = {
+        "Integer": "int",
+        "Long": "int",
+        "Short": "int",
+        "Byte": "int",
+        "Double": "float",
+        "Float": "float",
+        "Character": "str",
+        "Boolean": "bool",
+        "String": "str",
+        "Object": "object",
+    }
+    stub_builtins = ("None", "int", "float", "str", "bool", "object", "list", "array")
+    re_stub_name = re.compile(r"[\w.]+\[?")
+    re_stub_qualified = re.compile(r"\b[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+")
+
+    def __init__(self, j2p: JavaToPython, cache_size: int = 8192):
         self.j2p = j2p
+        self._resolve_type = functools.lru_cache(maxsize=cache_size)(self._resolve_type_uncached)
+        self._resolve_typehint = functools.lru_cache(maxsize=cache_size)(self._resolve_typehint_uncached)
+        self._python_resolve = functools.lru_cache(maxsize=cache_size)(self._python_resolve_uncached)
+        self._stub_resolve = functools.lru_cache(maxsize=cache_size)(self._stub_resolve_uncached)
+        profiler.register_cache("resolve_type_cache", self._resolve_type)
+        profiler.register_cache("resolve_typehint_cache", self._resolve_typehint)
+        profiler.register_cache("python_resolve_cache", self._python_resolve)
+        profiler.register_cache("stub_resolve_cache", self._stub_resolve)
+
+    def cache_clear(self):
+        """
+        Forget resolved types, needed when the symbol index changes
+        """
+        self._resolve_type.cache_clear()
+        self._resolve_typehint.cache_clear()
+        self._python_resolve.cache_clear()
+        self._stub_resolve.cache_clear()
 
     def convert_type(self, name):
         """
         Convert Java-type to Python-equivalent type
 
-        Based on https://www.jython.org/jython-old-sites/archive/22/userguide.html
         :param name: type name (str)
         :return: python type represented as str
         """
-        python_equivalents = {
-            "java.lang.String": "str",
-            "List[java.lang.Byte]": "array",
-            "java.lang.Int": "int",
-            "java.lang.Double": "float",
-            "java.lang.Short": "int",
-            "java.lang.Float": "float",
-            "java.lang.List": "list",
-            "java.lang.Byte": "int",
-            "java.lang.Char": "str",
-            "java.lang.Boolean": "bool"  # This have to be ok...
-        }
-
-        if name in python_equivalents:
-            return python_equivalents.get(name)
-        else:
-            return name
+        return self.python_equivalents.get(name, name)
 
     def resolve_type(self, name, klassfile: Union[None, KlassFile] = None, imports: List[Union[str, jtree.Import]] = None):
         """
@@ -82,63 +158,53 @@ class TypeResolver(object):
         :param imports: list of packages (str or Import instace) used to resolve classes
         :return: pkg.name.class
         """
-        basic_types = {
-            "int": "java.lang.Int",
-            "byte": "java.lang.Byte",
-            "boolean": "java.lang.Boolean",
-            "char": "java.lang.Char",
-            "double": "java.lang.Double",
-            "float": "java.lang.Float",
-            "long": "java.lang.Long",
-            "short": "java.lang.Short"
-        }
-
-        if name in basic_types:
-            return basic_types.get(name)
-
-        if imports is None:
-            imports = []
-
-        if klassfile is not None:
-            for imp in klassfile.imports:
-                _imp = ImportHelper(imp.node.path)
-                if j2p.has_package(_imp.package_name):
-                    pkg = j2p.open_package(_imp.package_name)
-                    if name in pkg.class_names:
-                        return pkg.name + "." + name
-
-        default_imports = ["java.lang.*"]
-        imports.extend(default_imports)
+        return self._resolve_type(name, () if klassfile is None else klassfile.imports,
+                                  () if imports is None else tuple(imports))
 
-        for imp in imports:
+    def _resolve_type_uncached(self, name, klass_imports: Tuple[Import, ...], imports: tuple):
+        if name in self.basic_types:
+            return self.basic_types.get(name)
+
+        symbols = self.j2p.symbols
+        if not symbols.lookup(name):
+            # No class with this name anywhere in the source tree
+            return name
+
+        for imp in klass_imports:
+            package_name = ImportHelper(imp.path).package_name
+            if symbols.has_class(package_name, name):
+                return package_name + "." + name
+
+        for imp in imports + self.default_imports:
             package_name = ImportHelper(imp).package_name
-            if j2p.has_package(package_name):
-                pkg = j2p.open_package(package_name)
-                if name in pkg.class_names:
-                    return pkg.name + "." + name
+            if symbols.has_class(package_name, name):
+                return package_name + "." + name
 
         # Unable to find package for class
         return name
 
     def resolve_typehint(self, typeobj: Type, klassfile: KlassFile = None):
+        return self._resolve_typehint(typeobj, () if klassfile is None else klassfile.imports)
+
+    def _resolve_typehint_uncached(self, typeobj: Type, klass_imports: Tuple[Import, ...]):
         if typeobj is None:
             return "None"
         if typeobj.has_children():
             if typeobj.is_reference() and typeobj.name == "List":
-                return f"List[{self.resolve_typehint(typeobj.get_children())}]"
+                return f"List[{self._resolve_typehint(typeobj.get_children(), ())}]"
             else:
-                return self.resolve_type(typeobj.name)
+                return self._resolve_type_uncached(typeobj.name, (), ())
         else:
             if typeobj.is_basic():
                 if typeobj.is_array():
-                    return f"List[{self.resolve_type(typeobj.name, klassfile=klassfile)}]"
+                    return f"List[{self._resolve_type_uncached(typeobj.name, klass_imports, ())}]"
                 else:
-                    return self.resolve_type(typeobj.name)
+                    return self._resolve_type_uncached(typeobj.name, (), ())
             elif typeobj.is_reference():
                 if typeobj.is_array():
-                    return f"List[{self.resolve_type(typeobj.name, klassfile=klassfile)}]"
+                    return f"List[{self._resolve_type_uncached(typeobj.name, klass_imports, ())}]"
                 else:
-                    return self.resolve_type(typeobj.name, klassfile=klassfile)
+                    return self._resolve_type_uncached(typeobj.name, klass_imports, ())
             else:
                 raise Exception("You have reached unreachable code!")
 
@@ -149,81 +215,490 @@ class TypeResolver(object):
         :param klassfile: Klass file
         :return: python equivalent type
         """
+        return self._python_resolve(typeobj, () if klassfile is None else klassfile.imports)
 
+    def _python_resolve_uncached(self, typeobj: Type, klass_imports: Tuple[Import, ...]):
         if typeobj is None:
             return "None"
         if typeobj.has_children():
             if typeobj.is_reference() and typeobj.name == "List":
-                return f"List[{self.python_resolve(typeobj.get_children())}]"
+                return f"List[{self._python_resolve(typeobj.get_children(), ())}]"
             else:
-                return self.convert_type(self.resolve_type(typeobj.name, klassfile=klassfile))
+                return self.convert_type(self._resolve_type_uncached(typeobj.name, klass_imports, ()))
         else:
             if typeobj.is_basic():
                 if typeobj.is_array():
-                    #return f"List[{self.convert_type(self.resolve_type(typeobj.name, klassfile=klassfile))}]"
-                    converted_type = f"List[{self.resolve_type(typeobj.name, klassfile=klassfile)}]"
+                    converted_type = f"List[{self._resolve_type_uncached(typeobj.name, klass_imports, ())}]"
                     return self.convert_type(converted_type)
-                    #return f"List[{self.convert_type(self.resolve_type(typeobj.name, klassfile=klassfile))}]"
                 else:
-                    return self.convert_type(self.resolve_type(typeobj.name))
+                    return self.convert_type(self._resolve_type_uncached(typeobj.name, (), ()))
             elif typeobj.is_reference():
                 if typeobj.is_array():
-                    return f"List[{self.convert_type(self.resolve_type(typeobj.name, klassfile=klassfile))}]"
+                    return f"List[{self.convert_type(self._resolve_type_uncached(typeobj.name, klass_imports, ()))}]"
                 else:
-                    return self.convert_type(self.resolve_type(typeobj.name, klassfile=klassfile))
+                    return self.convert_type(self._resolve_type_uncached(typeobj.name, klass_imports, ()))
             else:
                 raise Exception("You have reached unreachable code!")
 
+    def stub_resolve(self, typeobj: Type, klassfile: KlassFile = None):
+        """
+        python_resolve for stubs, where every name has to be defined: typing.List is referred to as _List, so a
+        java List class does not shadow it, and names the stub does not define become _Any
+        :return: annotation
+        """
+        return self._stub_resolve(typeobj, () if klassfile is None else klassfile.imports)
+
+    def _stub_resolve_uncached(self, typeobj: Type, klass_imports: Tuple[Import, ...]):
+        if typeobj is not None and typeobj.has_children() and typeobj.is_reference() and typeobj.name == "List":
+            # wildcard (<?>) and diamond (<>) arguments hold anything, bounded wildcards their bound
+            argument = typeobj.get_children()
+            return f"_List[{self._stub_resolve(argument, klass_imports) if argument is not None else '_Any'}]"
+        annotation = self._python_resolve(typeobj, klass_imports)
+        return self.re_stub_name.sub(lambda match: self.stub_name(match.group(0), klass_imports), annotation)
+
+    def stub_name(self, name: str, klass_imports: Tuple[Import, ...]) -> str:
+        """
+        Name in a stub annotation, qualified names of the source tree are defined by the package imports of the
+        stub header, simple names by a single-type import of a class of the source tree, a wildcard import of a
+        package of the source tree or the package itself (classes of the source tree the imports did not qualify).
+        Anything else, such as type variables or classes outside the source tree, is unknown.
+        """
+        if name == "List[":
+            return "_List["
+        name = self.stub_equivalents.get(name, name)
+        if name in self.stub_builtins:
+            return name
+        symbols = self.j2p.symbols
+        if "." in name:
+            package_name, _, klass_name = name.rpartition(".")
+            if symbols.has_class(package_name, klass_name):
+                return name
+            return self.stub_java_lang.get(klass_name, "_Any") if package_name == "java.lang" else "_Any"
+        for imp in klass_imports:
+            if imp.static:
+                continue
+            if imp.python_name == name:
+                return name if symbols.has_class(imp.python_package, name) else self.stub_java_lang.get(name, "_Any")
+            if imp.wildcard and symbols.has_class(imp.python_package, name):
+                return f"{imp.python_package}.{name}"
+        if symbols.lookup(name):
+            return name
+        return self.stub_java_lang.get(name, "_Any")
+
+    def stub_imports(self, imports: Iterable[Import], klass_names: List[str]) -> List[Import]:
+        """
+        Single-type imports a stub header turns into from imports: classes of the source tree, except those of the
+        package itself, which the stub defines
+        """
+        symbols = self.j2p.symbols
+        stub_imports = []
+        names = set()
+        for imp in imports:
+            if imp.static or imp.wildcard or imp.python_name in klass_names or imp.python_name in names:
+                continue
+            if symbols.has_class(imp.python_package, imp.python_name):
+                names.add(imp.python_name)
+                stub_imports.append(imp)
+        return stub_imports
+
+    def stub_modules(self, body: str) -> List[str]:
+        """
+        Packages a stub has to import: those of the qualified names in its class definitions, stub_name only
+        leaves names of the source tree qualified
+        :param body: the stub's class definitions
+        """
+        modules = []
+        for name in self.re_stub_qualified.findall(body):
+            module = name.rpartition(".")[0]
+            if module not in modules:
+                modules.append(module)
+        return modules
+
+    def stub_bases(self, klassfile: KlassFile) -> List[str]:
+        """
+        Base classes of a class in a stub, unknown bases collapse into one _Any
+        """
+        bases = []
+        for base in klassfile.klass.inheritance:
+            base = self.stub_name(self.resolve_type(base), klassfile.imports)
+            if base not in bases:
+                bases.append(base)
+        return bases
+
+    def stub_methods(self, klassfile: KlassFile) -> List[StubMethod]:
+        """
+        Methods of a class in a stub, Java overloads become @overload variants next to each other
+        Variants whose parameter types only differed in java (int and long) are declared once.
+        """
+        overloads = collections.OrderedDict()
+        for method in klassfile.klass.methods:
+            parameter_types = tuple(self.stub_resolve(parameter.type, klassfile) for parameter in method.parameters)
+            variants = overloads.setdefault(method.name, collections.OrderedDict())
+            if parameter_types in variants:
+                continue
+            parameters = ", ".join(["self"] + [f"{name}: {parameter_type}" for name, parameter_type in
+                                               zip(method.parameter_names[1:], parameter_types)])
+            variants[parameter_types] = (parameters, self.stub_resolve(method.return_type, klassfile))
+        methods = []
+        for name, variants in overloads.items():
+            for parameters, return_type in variants.values():
+                methods.append(StubMethod(name, parameters, return_type, len(variants) > 1))
+        return methods
+
+
+StubMethod = collections.namedtuple("StubMethod", ("name", "parameters", "return_type", "overload"))
+
+
+def create_environment(template_dir: str, type_resolver: TypeResolver,
+                       bytecode_cache_dir: Union[str, None] = None) -> jinja2.Environment:
+    """
+    Jinja environment with the type filters bound to type_resolver
+    Compiled templates are kept in memory, and with bytecode_cache_dir on disk as well. Both are keyed by the
+    template source, so a changed template is compiled again.
+    :param bytecode_cache_dir: directory for compiled templates, shared between runs
+    """
+    bytecode_cache = None
+    if bytecode_cache_dir is not None:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+    environment = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(searchpath=template_dir),
+        bytecode_cache=bytecode_cache
+    )
+    environment.filters["resolve_type"] = profiler.wrap("resolve", type_resolver.resolve_type)
+    environment.filters["resolve_typehint"] = profiler.wrap("resolve", type_resolver.resolve_typehint)
+    environment.filters["convert_type"] = profiler.wrap("resolve", type_resolver.convert_type)
+    environment.filters["python_resolve"] = profiler.wrap("resolve", type_resolver.python_resolve)
+    environment.filters["stub_resolve"] = profiler.wrap("resolve", type_resolver.stub_resolve)
+    environment.filters["stub_imports"] = profiler.wrap("resolve", type_resolver.stub_imports)
+    environment.filters["stub_modules"] = profiler.wrap("resolve", type_resolver.stub_modules)
+    environment.filters["stub_bases"] = profiler.wrap("resolve", type_resolver.stub_bases)
+    environment.filters["stub_methods"] = profiler.wrap("resolve", type_resolver.stub_methods)
+    return environment
+
 
 class PackageRenderer(object):
-    def __init__(self, template_dir: str, type_resolver: TypeResolver, package: Package) -> PackageRenderer:
+    def __init__(self, template_dir: str, type_resolver: TypeResolver, package: Package,
+                 environment: Union[jinja2.Environment, Emitter, None] = None, batch_size: Union[int, None] = None,
+                 monitor: Union[MemoryMonitor, None] = None, docs: str = "full") -> PackageRenderer:
+        """
+        :param environment: jinja environment or Emitter shared between renderers, a jinja environment is created
+                            from template_dir when not given
+        :param batch_size: parse and emit classes in batches (see PackageTemplateHelper)
+        :param monitor: measures batches and keeps memory below its ceiling
+        :param docs: documentation level, handed to the templates as docs
+        """
         self.package = package
-        self.environment = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(searchpath=template_dir)
-        )
+        self.docs = docs
         self.type_resolver = type_resolver
+        self.batch_size = batch_size
+        self.monitor = monitor
+        if environment is None:
+            environment = create_environment(template_dir, type_resolver)
+        self.environment = environment
 
-        self.environment.filters["resolve_type"] = type_resolver.resolve_type
-        self.environment.filters["resolve_typehint"] = type_resolver.resolve_typehint
-        self.environment.filters["convert_type"] = type_resolver.convert_type
-        self.environment.filters["python_resolve"] = type_resolver.python_resolve
+    def template_helper(self, release: bool = False) -> PackageTemplateHelper:
+        return PackageTemplateHelper(self.package, release=release, batch_size=self.batch_size, monitor=self.monitor)
 
     def render(self):
         template = self.environment.get_template("class.txt")
 
-        return template.render(package=PackageTemplateHelper(self.package), now=datetime.datetime.utcnow)
+        with profiler.phase("package"):
+            return template.render(package=self.template_helper(), now=datetime.datetime.utcnow, docs=self.docs)
+
+    def render_to(self, fp: TextIO, template_name: str = "class.txt", release: bool = True):
+        """
+        Stream rendered package to a file object as it is generated
+        Each class file is released once it has been written, so memory does not grow with the rendered output
+        :param fp: writable text file object
+        :param template_name: class.txt for the runtime module, stub.txt for a .pyi stub
+        :param release: release class files once written, keep them when the package is rendered again
+        """
+        template = self.environment.get_template(template_name)
+        stream = template.stream(package=self.template_helper(release), now=datetime.datetime.utcnow, docs=self.docs)
+        with profiler.phase("package"):
+            stream.dump(fp)
+
+
+    def render_modules(self, directory: str, release: bool = True, outputs: Union[OutputFiles, None] = None,
+                       klass_names: Union[Set[str], None] = None):
+        """
+        Write one module per class plus an __init__.py that imports class modules on first access
+        Class modules are named _ClassName, so importing a module never shadows the class in the package
+        :param directory: python package directory
+        :param outputs: OutputFiles to write through, files with unchanged content are left untouched
+        :param klass_names: only write the modules of these classes, None writes every class
+        """
+        only = klass_names
+        if outputs is None:
+            outputs = OutputFiles()
+        init_filename = os.path.join(directory, "__init__.py")
+        if not outputs.replaceable(init_filename):
+            raise FileExistsError(f"{init_filename} was not written by java2py, refusing to replace it")
+        helper = self.template_helper(release)
+        klass_names = []
+        template = self.environment.get_template("module.txt")
+        with profiler.phase("package"):
+            for klassfile in helper.klasses:
+                if klassfile.klass is None:
+                    continue
+                klass_names.append(klassfile.klass.name)
+                if only is not None and klassfile.klass_name not in only:
+                    continue
+                with outputs.open(os.path.join(directory, "_" + klassfile.klass.name + ".py")) as fp:
+                    template.stream(package=helper, klassfile=klassfile, now=datetime.datetime.utcnow,
+                                    docs=self.docs).dump(fp)
+                    fp.write("\n")
+
+        template = self.environment.get_template("init.txt")
+        with outputs.open(init_filename) as fp:
+            template.stream(klass_names=klass_names, now=datetime.datetime.utcnow).dump(fp)
+            fp.write("\n")
 
 
 class JavaToPython(object):
-    def __init__(self, source_dir):
+    backends = ("auto", "emitter", "jinja")
+
+    def __init__(self, source_dir, cache_dir: Union[str, None] = None, jobs: int = 1, docs: str = "full",
+                 fast_parse: bool = False, backend: str = "auto", batch_size: Union[int, None] = None,
+                 monitor: Union[MemoryMonitor, None] = None, stream: bool = False):
+        """
+        :param source_dir: directory with java packages, a zip/jar archive of them (JDK src.zip, -sources.jar) or an
+                           api index written from them
+        :param fast_parse: skip method bodies while parsing
+        :param backend: emitter writes the stock templates' output directly, jinja renders templates/,
+                        auto uses the emitter unless templates/ was customized
+        :param batch_size: parse and emit classes in batches of this many, so only one batch of parsed classes is
+                           held at a time. Classes are parked in the disk cache in between, a temporary one
+                           without cache_dir, or loaded again from the api index.
+        :param monitor: measures batches and keeps memory below its ceiling
+        :param stream: packages are rendered with release, which takes class skeletons first and loads each class
+                       again when it is rendered. Classes are parked in the disk cache like batches, so they are
+                       not parsed twice.
+        """
+        if backend not in self.backends:
+            raise ValueError(f"Unknown backend {backend}, expected one of {', '.join(self.backends)}")
         if source_dir.endswith("/") or source_dir.endswith("\\"):
             source_dir = source_dir[:-1]
-        self.source_dir = source_dir + os.sep
-        if not os.path.isdir(self.source_dir):
-            raise FileNotFoundError(f"Could not find source directory {self.source_dir}")
+        self.source = open_source(source_dir)
+        self.source_dir = source_dir + os.sep if isinstance(self.source, DirectorySource) else source_dir
+        self.tmp_cache_dir = None  # type: Union[str, None]
+        if (batch_size is not None or stream) and cache_dir is None and not isinstance(self.source, ApiIndex):
+            self.tmp_cache_dir = tempfile.mkdtemp(prefix="java2py-batch-")
+        disk_cache_dir = cache_dir if cache_dir is not None else self.tmp_cache_dir
+        disk_cache = DiskCache(disk_cache_dir, fast=fast_parse) if disk_cache_dir is not None else None
+        self.parse_cache = ParseCache(disk_cache=disk_cache, jobs=jobs, fast=fast_parse)
+        self.symbols = SymbolIndex.from_source(self.source)
+        self.type_resolver = None  # type: Union[TypeResolver, None]
+        self.backend = backend
+        self.environment = None  # type: Union[jinja2.Environment, Emitter, None]
+        self.bytecode_cache_dir = os.path.join(cache_dir, "jinja") if cache_dir is not None else None
+        self.batch_size = batch_size
+        self.monitor = monitor
+        doc.check_documentation_level(docs)
+        self.docs = docs
 
     def open_package(self, package_name):
-        package_dir = self.source_dir + os.sep.join(package_name.split(".")) + os.sep
-        if not os.path.isdir(package_dir):
-            raise FileNotFoundError(f"Could not open package directory {package_dir}")
+        if not self.symbols.has_package(package_name):
+            raise FileNotFoundError(f"Could not find package {package_name} in {self.source}")
 
-        pkg = Package(package_dir, package_name)
+        pkg = Package(self.source, package_name, parse_cache=self.parse_cache, symbols=self.symbols)
         return pkg
 
     def has_package(self, package_name):
-        package_dir = self.source_dir + os.sep.join(package_name.split("."))
-        if not os.path.isdir(package_dir):
-            return False
-        return True
+        return self.symbols.has_package(package_name)
+
+    def close(self):
+        """
+        Shut down worker processes used for parsing, close the source archive and remove the temporary disk cache
+        """
+        self.parse_cache.close()
+        self.source.close()
+        if self.tmp_cache_dir is not None:
+            shutil.rmtree(self.tmp_cache_dir, ignore_errors=True)
 
     def get_type_resolver(self):
-        return TypeResolver(self)
+        """
+        Type resolver shared by every package of the run, so resolved types are reused between packages
+        """
+        if self.type_resolver is None:
+            self.type_resolver = TypeResolver(self)
+        return self.type_resolver
+
+    def get_environment(self) -> Union[jinja2.Environment, Emitter]:
+        """
+        Jinja environment or Emitter shared by every package of the run, templates are loaded and compiled once
+        """
+        if self.environment is None:
+            backend = self.backend
+            if backend == "auto":
+                backend = "emitter" if emits_templates("templates/") else "jinja"
+                if backend == "jinja":
+                    sys.stderr.write("templates/ differs from the stock templates, rendering with jinja\n")
+            if backend == "emitter":
+                self.environment = Emitter(self.get_type_resolver())
+            else:
+                self.environment = create_environment("templates/", self.get_type_resolver(), self.bytecode_cache_dir)
+        return self.environment
+
+    def reload_templates(self):
+        """
+        Choose the backend again after templates changed, so edited templates are rendered with jinja
+        """
+        if self.backend == "auto":
+            self.environment = None
+
+    def get_renderer(self, package: Package) -> PackageRenderer:
+        return PackageRenderer(template_dir="templates/", type_resolver=self.get_type_resolver(), package=package,
+                               environment=self.get_environment(), batch_size=self.batch_size, monitor=self.monitor,
+                               docs=self.docs)
+
+    def reload_symbols(self):
+        """
+        Index the source directory again, after classes were added or removed
+        """
+        self.symbols = SymbolIndex.from_source(self.source)
+        if self.type_resolver is not None:
+            self.type_resolver.cache_clear()
+
+    def find_packages(self, prefix: str) -> List[str]:
+        """
+        Find packages named prefix or nested below it that contain classes
+        :param prefix: package name, e.g. java.util
+        :return: sorted list of package names
+        """
+        package_names = []
+        for package_name, class_names in self.symbols.packages.items():
+            if package_name != prefix and not package_name.startswith(prefix + "."):
+                continue
+            if len(class_names) > 0:
+                package_names.append(package_name)
+        return sorted(package_names)
 
     def create_python_package(self, package_name):
         pkg = self.open_package(package_name)
-        renderer = PackageRenderer(template_dir="templates/", type_resolver=self.get_type_resolver(), package=pkg)
+        renderer = self.get_renderer(pkg)
         return renderer.render()
 
+    def write_python_package(self, package_name, fp: TextIO, release: bool = True):
+        """
+        Create python package and stream it to fp
+        :param release: release parsed classes once written, pass False when the package is rendered again
+        """
+        pkg = self.open_package(package_name)
+        renderer = self.get_renderer(pkg)
+        renderer.render_to(fp, release=release)
+
+    def write_python_stub(self, package_name, fp: TextIO, release: bool = True):
+        """
+        Create PEP 484 stub (.pyi) of python package and stream it to fp
+        """
+        pkg = self.open_package(package_name)
+        renderer = self.get_renderer(pkg)
+        renderer.render_to(fp, template_name="stub.txt", release=release)
+
+    def package_classes(self, pkg: Package, phase: str,
+                        release: bool = False) -> Iterator[Tuple[str, Union[KlassFile, None]]]:
+        """
+        Parsed classes of a package sorted by name
+        Without batches classes stay in the parse cache, so rendering the package afterwards reuses them. With
+        batches they are parsed a batch at a time and released once the caller moves on.
+        :param phase: name the batches are measured as
+        :param release: release each class once the caller moves on, batches always do
+        :return: iterator of (class name, KlassFile or None if the class could not be parsed)
+        """
+        klass_names = sorted(pkg.list_class_names())
+        if self.batch_size is None:
+            pkg.prefetch_classes(klass_names)
+            for klass_name in klass_names:
+                yield klass_name, pkg.parse_class(klass_name)
+                if release:
+                    pkg.release_class(klass_name)
+            return
+        monitor = self.monitor if self.monitor is not None else MemoryMonitor()
+        batch_size = monitor.batch_size(self.batch_size)
+        position = 0
+        while position < len(klass_names):
+            batch = klass_names[position:position + batch_size]
+            position += len(batch)
+            with monitor.phase(phase):
+                pkg.prefetch_classes(batch)
+                for klass_name in batch:
+                    yield klass_name, pkg.parse_class(klass_name)
+                    pkg.release_class(klass_name)
+            batch_size = monitor.adjust(batch_size)
+
+    def write_index(self, filename: str, package_names: List[str], outputs: Union[OutputFiles, None] = None,
+                    release: bool = False):
+        """
+        Write an api index of the packages, listing every package and class of the source tree
+        :param filename: SQLite database, replaced once complete
+        :param outputs: OutputFiles to write through, an unchanged index is left untouched
+        :param release: release parsed classes once indexed, keep them when the packages are rendered afterwards
+        """
+        writer = ApiIndexWriter(filename, self.symbols)
+        try:
+            for package_name in package_names:
+                pkg = self.open_package(package_name)
+                for klass_name, klassfile in self.package_classes(pkg, "index", release=release):
+                    writer.add(package_name, klass_name, klassfile, pkg.source_digest(klass_name))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close(outputs)
+
+    def write_python_docs(self, package_name, module_filename: str, level: str,
+                          outputs: Union[OutputFiles, None] = None):
+        """
+        Write the documentation of a slim package next to its module, with the _docs.py helper reading it
+        Classes are left in the parse cache (see package_classes), the module is rendered from them afterwards
+        :param module_filename: module of the package
+        :param level: documentation level of the resource, full or summary
+        """
+        resource = DocumentationResource(package_name, level)
+        for _, klassfile in self.package_classes(self.open_package(package_name), "docs"):
+            if klassfile is not None:
+                resource.add(klassfile)
+        resource.write(outputs if outputs is not None else OutputFiles(), module_filename, self.get_environment())
+
+    def write_python_modules(self, package_name, directory: str, release: bool = True,
+                             outputs: Union[OutputFiles, None] = None, klass_names: Union[Set[str], None] = None):
+        """
+        Create python package with one module per class in directory
+        :param klass_names: only write the modules of these classes, None writes every class
+        """
+        pkg = self.open_package(package_name)
+        renderer = self.get_renderer(pkg)
+        renderer.render_modules(directory, release=release, outputs=outputs, klass_names=klass_names)
+
+    def create_python_packages(self, package_names: List[str]) -> Iterator[Tuple[str, str]]:
+        """
+        Create python packages in one run, sharing symbol index and parse cache between them
+        :param package_names: java package names
+        :return: iterator of (package name, python source)
+        """
+        for package_name in package_names:
+            yield package_name, self.create_python_package(package_name)
+
+
+def package_outfile(outdir: str, package_name: str) -> str:
+    """
+    Output filename of a package in a python source tree, java.net is written to <outdir>/java/net/__init__.py
+    """
+    return os.path.join(outdir, *package_name.split("."), "__init__.py")
+
+
+def create_parent_packages(outdir: str, package_name: str):
+    """
+    Create empty __init__.py files for parent packages that were not generated themselves
+    """
+    parts = package_name.split(".")
+    for i in range(1, len(parts)):
+        filename = package_outfile(outdir, ".".join(parts[:i]))
+        if not os.path.exists(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            open(filename, "w", encoding="utf-8").close()
+
 
 
 if __name__ == "__main__":
@@ -237,17 +712,231 @@ if __name__ == "__main__":
         sys.exit()
 
     parser = argparse.ArgumentParser("Create Python Interface Class from Java Source Package")
-    parser.add_argument("--sourcedir", type=str, help="directory where java packages are located", required=True)
-    parser.add_argument("--package", type=str, help="Java Package to create python class from", required=True)
+    parser.add_argument("--sourcedir", type=str,
+                        help="directory where java packages are located, or a zip/jar archive of java sources")
+    parser.add_argument("--index", type=str, metavar="INDEX",
+                        help="api index written by --write-index, read in place of --sourcedir without parsing java")
+    parser.add_argument("--package", type=str, nargs="+", help="Java Package(s) to create python class from", required=True)
+    parser.add_argument("--recursive", action="store_true", help="include all packages nested below --package")
     parser.add_argument("--outfile", type=str, help="Filename to write python interface class to", required=False)
+    parser.add_argument("--outdir", type=str, help="directory to write one python package per java package to", required=False)
+    parser.add_argument("--split", action="store_true",
+                        help="write one module per class and a lazily importing __init__.py, requires --outdir")
+    parser.add_argument("--format", choices=["module", "stub", "both"], default="module",
+                        help="write the runtime module, a .pyi stub next to it, or both")
+    parser.add_argument("--cachedir", type=str, help="directory for the persistent parse cache", required=False)
+    parser.add_argument("--manifest", type=str,
+                        help="build manifest file, a run with unchanged inputs and intact outputs exits immediately")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and regenerate the classes affected by changed sources or templates")
+    parser.add_argument("--fast-parse", action="store_true",
+                        help="skip method bodies while parsing, falls back to a full parse for sources it can not handle")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="read, parse and render in concurrent stages, rendering classes as soon as they are parsed")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="with --pipeline, number of sources and parsed classes in flight at most")
+    parser.add_argument("--backend", choices=JavaToPython.backends, default="auto",
+                        help="emitter writes the stock templates' output without jinja (several times faster), "
+                             "jinja renders templates/, auto uses the emitter unless templates/ was customized")
+    parser.add_argument("--batch-size", type=int,
+                        help="parse and write classes in batches of this many, holding one batch of parsed classes "
+                             "at a time (a temporary disk cache parks them in between without --cachedir)")
+    parser.add_argument("--memory-limit", type=int, metavar="MB",
+                        help="keep resident memory below this ceiling: drop memoized results when it is exceeded, "
+                             "halve the batches while memory keeps growing above it, abort when it still grows with "
+                             "batches of one class (implies --batch-size)")
+    parser.add_argument("--memory-report", type=str, metavar="REPORT",
+                        help="trace allocations and write peak RSS and the top allocation sites per phase (json) to "
+                             "this file, a summary to stderr (implies --batch-size)")
+    parser.add_argument("--write-index", type=str, metavar="INDEX",
+                        help="write an SQLite index of the packages' classes, methods, types, constants and "
+                             "inheritance, without --outfile or --outdir nothing else is written")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes used for parsing")
+    parser.add_argument("--profile", type=str, metavar="REPORT",
+                        help="write timing report (json) to this file and a summary to stderr")
+    parser.add_argument("--docs", choices=doc.DOCUMENTATION_LEVELS, default="full",
+                        help="documentation to include: none, summary (first sentence) or full")
+    parser.add_argument("--slim", action="store_true",
+                        help="write signatures only, documentation goes to a compressed <module>.docs.json.gz next "
+                             "to the module, read on demand by the generated _docs.py helper")
 
     args = parser.parse_args()
     #print(args)
-    j2p = JavaToPython("sources")
+    if args.profile is not None:
+        profiler.enable()
+    if (args.sourcedir is None) == (args.index is None):
+        parser.error("one of --sourcedir or --index is required")
+    if args.index is not None and not is_index(args.index):
+        parser.error(f"--index {args.index} is not an api index")
+    if args.index is not None and args.pipeline:
+        parser.error("--pipeline parses java sources, it can not be combined with --index")
+    if args.write_index is not None and (args.watch or args.pipeline):
+        parser.error("--write-index can not be combined with --watch or --pipeline")
+    if args.slim and args.docs == "none":
+        parser.error("--slim moves documentation out of the module, it can not be combined with --docs none")
+    if args.batch_size is None and (args.memory_limit is not None or args.memory_report is not None):
+        args.batch_size = 256
+    if args.batch_size is not None and args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.batch_size is not None and (args.watch or args.pipeline):
+        parser.error("--batch-size can not be combined with --watch or --pipeline (--queue-size bounds its memory)")
+    monitor = None
+    if args.batch_size is not None:
+        # started before anything is parsed, so tracing sees every allocation
+        monitor = MemoryMonitor(limit=args.memory_limit * 2 ** 20 if args.memory_limit is not None else None,
+                                trace=args.memory_report is not None)
+    # slim modules are rendered without documentation, it goes to the documentation resource instead
+    try:
+        j2p = JavaToPython(args.sourcedir if args.sourcedir is not None else args.index, cache_dir=args.cachedir,
+                           jobs=args.jobs, docs="none" if args.slim else args.docs, fast_parse=args.fast_parse,
+                           backend=args.backend, batch_size=args.batch_size, monitor=monitor,
+                           stream=not args.watch and not args.pipeline)
+    except ValueError as exception:
+        parser.error(str(exception))
     #resolver = j2p.get_type_resolver()
     #print(resolver.resolve_type("IScannerCheck", ["burp.*"]))
-    pypackage = j2p.create_python_package(args.package)
-    if args.outfile is None:
-        print(pypackage)
+    if args.recursive:
+        package_names = []
+        for prefix in args.package:
+            package_names.extend(name for name in j2p.find_packages(prefix) if name not in package_names)
+    else:
+        package_names = args.package
+    if isinstance(j2p.source, ApiIndex):
+        listed_packages = j2p.source.listed_packages()
+        listed = [package_name for package_name in package_names if package_name in listed_packages]
+        if listed:
+            parser.error(f"packages listed but not indexed in {args.index}: {', '.join(listed)}, "
+                         f"include them in --package when writing the index")
+
+    # --write-index alone only writes the index
+    index_only = args.write_index is not None and args.outdir is None and args.outfile is None
+    if args.outdir is None and len(package_names) > 1 and not index_only:
+        parser.error("--outdir is required when creating more than one package")
+    if args.outdir is not None and args.outfile is not None:
+        parser.error("--outfile and --outdir can not be combined")
+    if args.split and args.outdir is None:
+        parser.error("--split requires --outdir")
+    if args.slim and args.outdir is None and args.outfile is None:
+        parser.error("--slim requires --outfile or --outdir")
+    if args.manifest is not None and args.outdir is None and args.outfile is None and args.write_index is None:
+        parser.error("--manifest requires --outfile, --outdir or --write-index")
+    if args.watch and args.outdir is None and args.outfile is None:
+        parser.error("--watch requires --outfile or --outdir")
+    if args.pipeline and (args.watch or (args.outdir is None and args.outfile is None)):
+        parser.error("--pipeline requires --outfile or --outdir and can not be combined with --watch")
+    if args.watch and not isinstance(j2p.source, DirectorySource):
+        parser.error("--watch requires a source directory")
+
+    manifest = None
+    inputs = None
+    if args.manifest is not None:
+        options = {key: value for key, value in vars(args).items()
+                   if key in ("package", "recursive", "outfile", "outdir", "split", "format", "docs", "slim",
+                               "write_index")}
+        manifest = BuildManifest(args.manifest)
+        inputs = BuildManifest.inputs_digest(j2p, package_names, "templates/", options)
+        if manifest.up_to_date(inputs):
+            j2p.close()
+            sys.stderr.write("up to date\n")
+            sys.exit(0)
+
+    import time
+    started = time.perf_counter()
+    outputs = OutputFiles(manifest.outputs if manifest is not None else ())
+    write_module = args.format in ("module", "both")
+    write_stub = args.format in ("stub", "both")
+    if args.outdir is not None and write_module:
+        # packages are written to <package path>/__init__.py, which may be a hand-written one like burp/__init__.py
+        for package_name in package_names:
+            filename = package_outfile(args.outdir, package_name)
+            if not outputs.replaceable(filename):
+                parser.error(f"{filename} was not written by java2py, refusing to replace it. "
+                             f"Move it away or choose another --outdir")
+    # watch mode keeps parsed classes, so later runs only parse changed files
+    release = not args.watch
+    # the stub is written from the classes parsed for the module, batches release them anyway (the stub loads them
+    # again from the disk cache)
+    module_release = release and (not write_stub or args.batch_size is not None)
+
+    def prepare_outfile(package_name):
+        """
+        Module filename of a package, creating its directory and parent packages with --outdir
+        """
+        if args.outdir is None:
+            return args.outfile
+        outfile = package_outfile(args.outdir, package_name)
+        os.makedirs(os.path.dirname(outfile), exist_ok=True)
+        create_parent_packages(args.outdir, package_name)
+        return outfile
+
+    def write_package(package_name, klass_names=None):
+        """
+        Write module and/or stub of a package
+        :param klass_names: in split mode only write the modules of these classes, None writes every class
+        """
+        outfile = prepare_outfile(package_name)
+        if outfile is None:
+            if write_module:
+                j2p.write_python_package(package_name, sys.stdout, release=module_release)
+                sys.stdout.write("\n")
+            if write_stub:
+                j2p.write_python_stub(package_name, sys.stdout, release=release)
+                sys.stdout.write("\n")
+            return
+
+        if args.slim:
+            j2p.write_python_docs(package_name, outfile, args.docs, outputs=outputs)
+        if write_module:
+            if args.split:
+                j2p.write_python_modules(package_name, os.path.dirname(outfile), release=module_release,
+                                         outputs=outputs, klass_names=klass_names)
+            else:
+                with outputs.open(outfile) as fp:
+                    j2p.write_python_package(package_name, fp, release=module_release)
+        if write_stub:
+            with outputs.open(os.path.splitext(outfile)[0] + ".pyi") as fp:
+                j2p.write_python_stub(package_name, fp, release=release)
+
+    if args.pipeline:
+        from pipeline import Pipeline
+        Pipeline(j2p, outputs, module=write_module, stub=write_stub, split=args.split,
+                 queue_size=args.queue_size, docs=args.docs if args.slim else None).run(package_names, prepare_outfile)
     else:
-        open(args.outfile,"w+", encoding="utf-8").write(pypackage)
+        try:
+            if args.write_index is not None:
+                # packages written afterwards are rendered from the classes parsed for the index
+                j2p.write_index(args.write_index, package_names, outputs=outputs, release=index_only)
+            if not index_only:
+                for package_name in package_names:
+                    write_package(package_name)
+        except MemoryLimitExceeded as exception:
+            j2p.close()
+            sys.stderr.write(f"{exception}\n")
+            sys.exit(1)
+    if args.watch:
+        import watch
+
+        def regenerate(targets):
+            for package_name, klass_names in targets.items():
+                write_package(package_name, klass_names)
+
+        if write_module and not args.split:
+            sys.stderr.write("--watch without --split renders the whole module of a package on every change, "
+                             "--split renders only the modules of the affected classes\n")
+        watch.watch(j2p, package_names, "templates/", regenerate, partial=args.split)
+    j2p.close()
+    if manifest is not None:
+        manifest.save(inputs, outputs.digests)
+        sys.stderr.write(f"{len(outputs.changed)} of {len(outputs.digests)} files changed\n")
+    if args.profile is not None:
+        profiler.write_report(args.profile)
+        profiler.summary()
+    if args.memory_report is not None:
+        monitor.write_report(args.memory_report)
+        monitor.summary()
+
+    if len(package_names) > 1 and not index_only:
+        elapsed = time.perf_counter() - started
+        klass_count = sum(len(j2p.symbols.class_names(name)) for name in package_names)
+        sys.stderr.write(f"created {len(package_names)} packages with {klass_count} classes "
+                         f"in {elapsed:.2f}s ({klass_count / elapsed:.1f} classes/s)\n")
@@ -1,61 +1,65 @@
+from __future__ import annotations
+
 import sys
 
 import javalang.tree as jtree
 from method import Method
-from typing import List, Union
-from common import Import
+from typing import List, Union, Tuple
+from common import Import, Model
 from common import Type
-from doc import ClassDocumentation, ClassDocumentationTemplateFacade, JavaDocumentation
+from doc import ClassDocumentation, ClassDocumentationTemplateFacade, DocumentationTemplateFacade, JavaDocumentation, \
+    class_documentation
 
 
-class Constant(object):
-    def __init__(self, node):
-        assert isinstance(node, jtree.ConstantDeclaration)
-        self.node = node
+class Constant(Model):
+    __slots__ = ("name", "value", "type", "docstr")
 
-    @property
-    def name(self):
-        return self.node.declarators[0].name
+    def __init__(self, name: str, value: str, type: Type, docstr: Union[str, None]):
+        self._assign(name, value, type, docstr)
 
-    @property
-    def value(self):
-        if isinstance(self.node.declarators[0].initializer, jtree.MemberReference):
-            return self.node.declarators[0].initializer.member
-        elif isinstance(self.node.declarators[0].initializer, jtree.Literal):
-            return self.node.declarators[0].initializer.value
+    @classmethod
+    def from_node(cls, node: jtree.ConstantDeclaration) -> Constant:
+        assert isinstance(node, jtree.ConstantDeclaration)
+        declarator = node.declarators[0]
+        if isinstance(declarator.initializer, jtree.MemberReference):
+            value = declarator.initializer.member
+        elif isinstance(declarator.initializer, jtree.Literal):
+            value = declarator.initializer.value
         else:
-            return "None"
-
-    @property
-    def type(self):
-        return Type(self.node.type)
+            value = "None"
+        return cls(declarator.name, value, Type.from_node(node.type), getattr(node, "documentation", None))
 
     @property
     def documentation(self):
-        if not hasattr(self.node, "documentation"):
-            return None
-        if self.node.documentation == None:
+        if self.docstr is None:
             return None
         else:
-            return JavaDocumentation(self.node.documentation)
+            return JavaDocumentation(self.docstr)
 
 
-class KlassFile(object):
-    java: jtree.CompilationUnit
+class KlassFile(Model):
+    """
+    Class model extracted from a compilation unit
 
-    def __init__(self, tree, klass_name):
-        assert isinstance(tree, jtree.CompilationUnit)
-        self.tree = tree
-        self.klass_name = klass_name
+    Only holds what the templates use, the javalang tree is dropped after extraction
+    """
+    __slots__ = ("klass_name", "imports", "klass", "docstr")
 
-    @property
-    def imports(self) -> List[Import]:
-        if not hasattr(self.tree, "imports"):
-            return []
-        return list(map(Import, self.tree.imports))
+    def __init__(self, klass_name: str, imports: Tuple[Import, ...], klass: Union[Klass, None],
+                 docstr: Union[str, None] = None):
+        self._assign(klass_name, imports, klass, docstr)
 
-    @property
-    def klass(self):
+    @classmethod
+    def from_tree(cls, tree: jtree.CompilationUnit, klass_name: str) -> KlassFile:
+        assert isinstance(tree, jtree.CompilationUnit)
+        imports = tuple(map(Import.from_node, tree.imports or []))
+        # Seems like javalang have a bug and do not return documentation for the class file
+        # TODO investigate and report issue
+        docstr = getattr(tree.package, "documentation", None)
+        return cls(klass_name, imports, cls.find_klass(tree, klass_name), docstr)
+
+    @staticmethod
+    def find_klass(tree: jtree.CompilationUnit, klass_name: str) -> Union[Klass, None]:
         """
         We only want to grab one public class
 
@@ -68,73 +72,71 @@ class KlassFile(object):
                 filter(
                     lambda _type: isinstance(
                         _type, (jtree.InterfaceDeclaration, jtree.ClassDeclaration, jtree.AnnotationDeclaration)
-                    ), self.tree.types)
+                    ), tree.types)
         )
         if len(_klasses) == 0:
-            sys.stderr.write(f"No class found in KlassFile \"{self.klass_name}\"\n")
+            sys.stderr.write(f"No class found in KlassFile \"{klass_name}\"\n")
             return None
             #raise Exception(f"No class found in KlassFile {self.klass_name}")
         elif len(_klasses) > 1:
-            klass = list(filter(lambda _klass: _klass.name == self.klass_name, _klasses))
+            klass = list(filter(lambda _klass: _klass.name == klass_name, _klasses))
             if len(klass) == 1:
-                return Klass(klass[0])
+                return Klass.from_node(klass[0])
             else:
-                sys.stderr.write(f"Too many classes found in KlassFile \"{self.klass_name}\"")
+                sys.stderr.write(f"Too many classes found in KlassFile \"{klass_name}\"")
         else:
-            return Klass(_klasses[0])
+            return Klass.from_node(_klasses[0])
 
     @property
     def documentation(self):
-        # Seems like javalang have a bug and do not return documentation for the class file
-        # TODO investigate and report issue
-        if not hasattr(self.tree.package, "documentation"):
-            return None
-        if self.tree.package.documentation is None:
+        if self.docstr is None:
             return None
         else:
-            return JavaDocumentation(self.tree.package.documentation)
-
+            return JavaDocumentation(self.docstr)
 
-class Klass(object):
-    java: jtree.InterfaceDeclaration
+    def skeleton(self) -> KlassFile:
+        """
+        Class file without methods, constants and documentation, what ordering and imports need
+        """
+        klass = self.klass
+        if klass is None:
+            return self
+        return KlassFile(self.klass_name, self.imports,
+                         Klass(klass.name, klass.modifiers, (), (), klass.inheritance, None))
 
-    def __init__(self, node):
-        assert isinstance(node, (jtree.InterfaceDeclaration,jtree.ClassDeclaration, jtree.AnnotationDeclaration))
-        self.node = node
 
+class Klass(Model):
+    __slots__ = ("name", "modifiers", "methods", "constants", "inheritance", "docstr")
 
-    @property
-    def name(self):
-        return self.node.name
+    def __init__(self, name: str, modifiers: Tuple[str, ...], methods: Tuple[Method, ...],
+                 constants: Tuple[Constant, ...], inheritance: Tuple[str, ...], docstr: Union[str, None]):
+        self._assign(name, modifiers, methods, constants, inheritance, docstr)
 
-    @property
-    def methods(self) -> List[Method]:
-        if not hasattr(self.node, "methods"):
-            return []
+    @classmethod
+    def from_node(cls, node: Union[jtree.InterfaceDeclaration, jtree.ClassDeclaration, jtree.AnnotationDeclaration]) -> Klass:
+        assert isinstance(node, (jtree.InterfaceDeclaration,jtree.ClassDeclaration, jtree.AnnotationDeclaration))
+        methods = tuple(map(Method.from_node, getattr(node, "methods", [])))
+        constants = tuple(map(Constant.from_node, filter(
+            lambda field: isinstance(field, jtree.ConstantDeclaration), getattr(node, "fields", []))))
 
-        return list(map(Method, self.node.methods))
+        extensions = []
+        if hasattr(node, "extends") and node.extends is not None:
+            # interfaces extend a list of types, classes a single type
+            extends = node.extends if isinstance(node.extends, list) else [node.extends]
+            for extension in extends:
+                extensions.append(extension.name)
+        else:
+            extensions.append("object")
 
-    @property
-    def constants(self) -> List[Constant]:
-        if not hasattr(self.node, "fields"):
-            return []
-        return list(map(Constant, filter(lambda field: isinstance(field, jtree.ConstantDeclaration), self.node.fields)))
+        return cls(node.name, tuple(sorted(node.modifiers)), methods, constants, tuple(extensions),
+                   getattr(node, "documentation", None))
 
     @property
     def documentation(self) -> Union[ClassDocumentationTemplateFacade, None]:
-        if not hasattr(self.node, "documentation"):
-            return ClassDocumentationTemplateFacade("")
-        if self.node.documentation is None:
-            return ClassDocumentationTemplateFacade("")
-        else:
-            return ClassDocumentationTemplateFacade(self.node.documentation)
+        return class_documentation(self.docstr)
 
-    @property
-    def inheritance(self) -> List[str]:
-        extensions = []
-        if hasattr(self.node, "extends") and self.node.extends is not None:
-            for extension in self.node.extends:
-                extensions.append(extension.name)
-        else:
-            extensions.append("object")
-        return extensions
+    def documentation_at(self, level: str) -> Union[DocumentationTemplateFacade, None]:
+        """
+        :param level: documentation level the templates render with (--docs)
+        """
+        return class_documentation(self.docstr, level)
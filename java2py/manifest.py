@@ -0,0 +1,135 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List
+
+from common import GENERATOR_VERSION
+
+GENERATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def content_digest(content: bytes) -> str:
+    """
+    Digest of generated content, ignoring the "# Autogenerated <timestamp>" line
+    """
+    if content.startswith(b"# Autogenerated"):
+        content = content.partition(b"\n")[2]
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_digest(filename: str) -> str:
+    with open(filename, "rb") as fp:
+        return content_digest(fp.read())
+
+
+def is_generated(filename: str) -> bool:
+    """
+    Whether filename is empty or starts with the "# Autogenerated" line the templates write
+    """
+    with open(filename, "rb") as fp:
+        head = fp.read(len(b"# Autogenerated"))
+    return head == b"" or head == b"# Autogenerated"
+
+
+class OutputFiles(object):
+    """
+    Writes outputs through temporary files and only replaces files whose content changed
+
+    Unchanged files keep their mtime, so IDEs and packaging steps do not pick them up again.
+    """
+    def __init__(self, generated: Iterable[str] = ()):
+        """
+        :param generated: files written by earlier runs, such as the outputs of a build manifest
+        """
+        self.digests = {}  # type: Dict[str, str]
+        self.changed = []  # type: List[str]
+        self.generated = set(generated)
+
+    @contextlib.contextmanager
+    def open(self, filename: str, binary: bool = False):
+        """
+        :param binary: open for writing bytes instead of utf-8 text
+        """
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filename, "wb") if binary else open(tmp_filename, "w", encoding="utf-8") as fp:
+                yield fp
+            self.replace(filename, tmp_filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    def replaceable(self, filename: str) -> bool:
+        """
+        Whether filename can be written without losing a hand-written file (such as burp/__init__.py): it does not
+        exist, a run wrote it or it looks generated
+        """
+        return not os.path.exists(filename) or filename in self.digests or filename in self.generated or \
+            is_generated(filename)
+
+    def replace(self, filename: str, tmp_filename: str):
+        """
+        Move a completed file into place, or drop it when filename already has the same content
+        """
+        digest = file_digest(tmp_filename)
+        if os.path.exists(filename) and file_digest(filename) == digest:
+            os.remove(tmp_filename)
+        else:
+            os.replace(tmp_filename, filename)
+            self.changed.append(filename)
+        self.digests[filename] = digest
+
+
+class BuildManifest(object):
+    """
+    Records a digest of everything a run depends on and digests of the files it wrote
+
+    A run with the same inputs whose outputs are still intact has nothing to do.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.inputs = None
+        self.outputs = {}  # type: Dict[str, str]
+        if os.path.exists(filename):
+            with open(filename, "r", encoding="utf-8") as fp:
+                manifest = json.load(fp)
+            self.inputs = manifest.get("inputs")
+            self.outputs = manifest.get("outputs", {})
+
+    @staticmethod
+    def inputs_digest(j2p, package_names: List[str], template_dir: str, options: dict) -> str:
+        """
+        Digest of generator, templates, options, the class names of the whole source tree (they decide how
+        types resolve) and the sources of the generated packages (as recorded in the index when generating from one)
+        """
+        digest = hashlib.sha256()
+        digest.update(GENERATOR_VERSION.encode("utf-8"))
+        digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        for filename in sorted(glob.glob(os.path.join(GENERATOR_DIR, "*.py"))) + \
+                sorted(glob.glob(os.path.join(template_dir, "*.txt"))):
+            digest.update(os.path.basename(filename).encode("utf-8"))
+            with open(filename, "rb") as fp:
+                digest.update(fp.read())
+        for package_name, class_names in sorted(j2p.symbols.packages.items()):
+            digest.update(f"{package_name}:{','.join(sorted(class_names))}\n".encode("utf-8"))
+        for package_name in package_names:
+            pkg = j2p.open_package(package_name)
+            for class_name in sorted(pkg.list_class_names()):
+                digest.update(f"{package_name}.{class_name}:{pkg.source_digest(class_name)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def up_to_date(self, inputs: str) -> bool:
+        if self.inputs != inputs or len(self.outputs) == 0:
+            return False
+        for filename, digest in self.outputs.items():
+            if not os.path.exists(filename) or file_digest(filename) != digest:
+                return False
+        return True
+
+    def save(self, inputs: str, outputs: Dict[str, str]):
+        self.inputs = inputs
+        self.outputs = dict(outputs)
+        with open(self.filename, "w", encoding="utf-8") as fp:
+            json.dump({"inputs": self.inputs, "outputs": self.outputs}, fp, indent=2, sort_keys=True)
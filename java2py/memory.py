@@ -0,0 +1,197 @@
+"""
+Memory measurement and ceiling of batched runs
+
+Batches are measured as phases (parse, render): resident set size after each batch, and with tracing enabled the
+peak of python allocations during the batch and the source lines that allocated most of what a run of batches of
+the phase left behind (tracemalloc snapshot compared to the one taken when the run began). Snapshots are taken
+when the phase changes, not after every batch, tracing still slows a run down noticeably. RSS is always measured.
+"""
+import contextlib
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Dict, TextIO, Union
+
+from profiling import profiler
+
+
+class MemoryLimitExceeded(MemoryError):
+    pass
+
+
+def current_rss() -> Union[int, None]:
+    """
+    :return: resident set size in bytes, None where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm", "r") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> Union[int, None]:
+    """
+    :return: peak resident set size of the process in bytes, None where the resource module is not available
+    (windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryMonitor(object):
+    """
+    Keeps a batched run below a memory ceiling
+
+    Once the resident set size exceeds the limit after a batch, memoized results (documentation, resolved types)
+    are dropped. CPython rarely returns freed memory to the system, so above the limit the resident set size only
+    tells whether a batch needed more memory than the process held before: batches that fit into it continue, a
+    batch that grew it beyond its highest size so far halves the batch size. A run that still grows with batches of
+    one class is aborted with MemoryLimitExceeded, before the system runs out of memory.
+    """
+    ignored_files = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+                     "<unknown>")
+
+    def __init__(self, limit: Union[int, None] = None, trace: bool = False, top: int = 10):
+        """
+        :param limit: memory ceiling in bytes, None for no ceiling
+        :param trace: trace python allocations with tracemalloc
+        :param top: allocation sites reported per phase
+        """
+        self.limit = limit
+        self.trace = trace
+        self.top = top
+        self.phases = {}  # type: Dict[str, dict]
+        self.snapshot = None  # type: Union[tracemalloc.Snapshot, None]
+        self.current_phase = None  # type: Union[str, None]
+        self.run_peak = 0  # traced peak (bytes) of the current run of batches of current_phase
+        self.highest_rss = None  # type: Union[int, None]
+        self.batches_shrunk = 0
+        self.max_batch_size = None  # type: Union[int, None]
+        if trace:
+            tracemalloc.start()
+            self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        # unfiltered, Snapshot.filter_traces matches every trace in python and takes seconds on a large heap, the
+        # ignored files are skipped in the compared statistics instead
+        return tracemalloc.take_snapshot()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Measure one batch of a phase
+        """
+        stats = self.phases.setdefault(name, {"batches": 0, "rss_kb": 0, "traced_peak_kb": 0, "top": []})
+        if self.trace:
+            if name != self.current_phase:
+                self.end_run()
+                self.current_phase = name
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            stats["batches"] += 1
+            rss = current_rss()
+            if rss is not None:
+                stats["rss_kb"] = max(stats["rss_kb"], rss // 1024)
+            if self.trace:
+                self.run_peak = max(self.run_peak, tracemalloc.get_traced_memory()[1])
+
+    def end_run(self):
+        """
+        End the current run of batches of a phase, its allocation sites are kept if its peak is the phase's highest
+        """
+        if self.current_phase is None:
+            return
+        stats = self.phases[self.current_phase]
+        snapshot = self.take_snapshot()
+        if self.run_peak // 1024 >= stats["traced_peak_kb"]:
+            compared = [stat for stat in snapshot.compare_to(self.snapshot, "lineno")
+                        if stat.traceback[0].filename not in self.ignored_files]
+            stats["top"] = [
+                {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_kb": round(stat.size_diff / 1024, 1), "count": stat.count_diff}
+                for stat in compared[:self.top] if stat.size_diff > 0
+            ]
+            stats["traced_peak_kb"] = self.run_peak // 1024
+        self.snapshot = snapshot
+        self.current_phase = None
+        self.run_peak = 0
+
+    def batch_size(self, batch_size: int) -> int:
+        """
+        :return: the requested batch size, or less once batches were shrunk to stay below the ceiling
+        """
+        return batch_size if self.max_batch_size is None else min(batch_size, self.max_batch_size)
+
+    def adjust(self, batch_size: int) -> int:
+        """
+        Check the ceiling after a batch, a shrunk batch size holds for the remaining phases and packages
+        :return: batch size for the next batches
+        :raises MemoryLimitExceeded: above the limit and still growing with batches of one class
+        """
+        batch_size = self.batch_size(batch_size)
+        if self.limit is None:
+            return batch_size
+        rss = current_rss()
+        if rss is None or rss <= self.limit:
+            return batch_size
+        for function in profiler.caches.values():
+            function.cache_clear()
+        gc.collect()
+        rss = current_rss()
+        if rss is None or rss <= self.limit:
+            return batch_size
+        if self.highest_rss is not None and rss <= self.highest_rss:
+            # the batch reused memory the process already held
+            return batch_size
+        self.highest_rss = rss
+        if batch_size == 1:
+            raise MemoryLimitExceeded(f"resident memory grew to {rss / 2 ** 20:.1f}MB, above the limit of "
+                                      f"{self.limit / 2 ** 20:.0f}MB, with batches of one class")
+        self.batches_shrunk += 1
+        self.max_batch_size = batch_size // 2
+        sys.stderr.write(f"resident memory {rss / 2 ** 20:.1f}MB is above the limit of {self.limit / 2 ** 20:.0f}MB, "
+                         f"continuing with batches of {self.max_batch_size} classes\n")
+        return self.max_batch_size
+
+    def report(self) -> dict:
+        if self.trace:
+            self.end_run()
+        peak = peak_rss()
+        return {
+            "peak_rss_kb": peak // 1024 if peak is not None else None,
+            "limit_kb": self.limit // 1024 if self.limit is not None else None,
+            "batches_shrunk": self.batches_shrunk,
+            "phases": self.phases,
+        }
+
+    def write_report(self, filename: str):
+        with open(filename, "w", encoding="utf-8") as fp:
+            json.dump(self.report(), fp, indent=2)
+
+    def summary(self, fp: TextIO = sys.stderr, top: int = 5):
+        """
+        Write peak RSS, and per phase the highest RSS after a batch, the peak of python allocations and the
+        sites that allocated most
+        """
+        report = self.report()
+        if report["peak_rss_kb"] is not None:
+            fp.write(f"peak rss {report['peak_rss_kb'] / 1024:.1f}MB\n")
+        else:
+            fp.write("peak rss unknown\n")
+        for name, stats in report["phases"].items():
+            fp.write(f"  {name:<8} {stats['batches']:>6} batches  rss {stats['rss_kb'] / 1024:>8.1f}MB")
+            if self.trace:
+                fp.write(f"  traced peak {stats['traced_peak_kb'] / 1024:>8.1f}MB")
+            fp.write("\n")
+            for site in stats["top"][:top]:
+                fp.write(f"      {site['size_kb']:>10.1f}KB {site['count']:>8} blocks  {site['site']}\n")
@@ -1,79 +1,75 @@
 from __future__ import annotations
-from typing import Union, List
+from typing import Union, List, Tuple
 
 import javalang.tree as jtree
-from common import Type
+from common import Model, Type
 
 
-class Parameter(object):
-    node: jtree.FormalParameter
+class Parameter(Model):
+    __slots__ = ("name", "type")
 
-    def __init__(self, node):
+    def __init__(self, name: str, type: Type):
+        self._assign(name, type)
+
+    @classmethod
+    def from_node(cls, node: jtree.FormalParameter) -> Parameter:
         assert isinstance(node, jtree.FormalParameter)
-        self.node = node
+        return cls(node.name, Type.from_node(node.type))
 
-    @property
-    def type(self):
-        return Type(self.node.type)
 
-    @property
-    def name(self):
-        return self.node.name
+class Method(Model):
+    __slots__ = ("name", "modifiers", "return_type", "parameters", "parameter_names", "docstr", "java_name")
 
+    reserved_method_names = ["yield", "def", "return"]
+    # TODO get a full list of keywords that cannot be used as parameter names
+    reserved_keywords = ["from", "import", "in", "def"]
 
-class Method(object):
-    node: jtree.MethodDeclaration
+    def __init__(self, name: str, modifiers: Tuple[str, ...], return_type: Union[Type, None],
+                 parameters: Tuple[Parameter, ...], parameter_names: Tuple[str, ...], docstr: Union[str, None],
+                 java_name: Union[str, None] = None):
+        """
+        :param name: python method name
+        :param java_name: name of the java method, when it differs from the python name
+        """
+        self._assign(name, modifiers, return_type, parameters, parameter_names, docstr,
+                     java_name if java_name is not None else name)
 
-    def __init__(self, node):
+    @classmethod
+    def from_node(cls, node: jtree.MethodDeclaration) -> Method:
         assert isinstance(node, jtree.MethodDeclaration)
-        self.node = node
-
-    @property
-    def name(self):
-        reserved_method_names = ["yield", "def", "return"]
-        name = self.node.name
-        if self.node.name in reserved_method_names:
-            name += "_"
-        return name
-
-    @property
-    def return_type(self):
-        if self.node.return_type is None:
-            return None
-        return Type(self.node.return_type)
+        return_type = Type.from_node(node.return_type) if node.return_type is not None else None
+        parameters = tuple(map(Parameter.from_node, node.parameters))
+        return cls(cls.python_method_name(node.name), tuple(sorted(node.modifiers)), return_type, parameters,
+                   cls.python_parameter_names(parameters), getattr(node, "documentation", None), node.name)
 
-    @property
-    def parameters(self):
-        for parameter in self.node.parameters:
-            yield Parameter(parameter)
+    @classmethod
+    def python_method_name(cls, name: str) -> str:
+        """
+        return the python name of java method name
+        """
+        return name + "_" if name in cls.reserved_method_names else name
 
-    @property
-    def parameter_names(self) -> List[str]:
+    @classmethod
+    def python_parameter_names(cls, parameters: Tuple[Parameter, ...]) -> Tuple[str, ...]:
         """
         return list of parameter names for this method
         """
         out = ["self"]
-        # TODO get a full list of keywords that cannot be used as parameter names
-        reserved_keywords = ["from", "import", "in", "def"]
-        for parameter in self.parameters:
+        for parameter in parameters:
             name = parameter.name
-            if parameter.name in reserved_keywords:
+            if parameter.name in cls.reserved_keywords:
                 name += "_"
             out.append(name)
-        #out.extend([parameter.name for parameter in self.parameters])
-
-        #out.replaceall("from", "_from")
-        return out
+        return tuple(out)
 
     @property
     def documentation(self):
-        from doc import MethodDocumentation, MethodDocumentationTemplateFacade
-        if not hasattr(self.node, "documentation"):
-            return None
-        if self.node.documentation is None:
-            return None
-        else:
-            return MethodDocumentationTemplateFacade(
-                self.node.documentation
-            )
+        from doc import method_documentation
+        return method_documentation(self.docstr)
 
+    def documentation_at(self, level: str):
+        """
+        :param level: documentation level the templates render with (--docs)
+        """
+        from doc import method_documentation
+        return method_documentation(self.docstr, level)
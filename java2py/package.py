@@ -1,37 +1,150 @@
 import sys
 
 from klass import KlassFile
+from apiindex import ApiIndex, source_digest
+from cache import ParseCache
+from symbols import SymbolIndex
+from sources import open_source
+from inheritance import InheritanceGraph
+from memory import MemoryMonitor
+from profiling import profiler
 from typing import List, Union
-import os
+import functools
 import javalang
 
+from fastparse import parse_signatures
+
+
+def parse_source(name: str, source: str, fast: bool = False) -> Union[KlassFile, None]:
+    """
+    Parse java source and extract its KlassFile model
+    Module level function so it can be sent to worker processes, which only send the compact model back
+    :param fast: skip method bodies (see fastparse), sources the fast parse can not handle are parsed in full
+    :return: KlassFile or None if the source could not be parsed
+    """
+    if fast:
+        try:
+            return KlassFile.from_tree(parse_signatures(source), klass_name=name)
+        except (ValueError, javalang.parser.JavaSyntaxError, javalang.tokenizer.LexerError):
+            profiler.count("fast_parse.fallback")
+    try:
+        return KlassFile.from_tree(javalang.parse.parse(source), klass_name=name)
+    except javalang.parser.JavaSyntaxError:
+        return None
 
 
 class Package(object):
-    def __init__(self, pkg_dir, package_name):
-        self.pkg_dir = pkg_dir
+    def __init__(self, source, package_name, parse_cache: Union[ParseCache, None] = None,
+                 symbols: Union[SymbolIndex, None] = None):
+        """
+        :param source: source provider (DirectorySource, ArchiveSource, ApiIndex) or source directory
+        """
+        self.source = open_source(source) if isinstance(source, str) else source
         self.package_name = package_name
+        self.parse_cache = parse_cache
+        self.symbols = symbols
 
     def list_class_names(self) -> List[str]:
         """
         Lists the classes that are found under a package (source directory)
         :return: List of classnames
         """
-        filenames = list(filter(lambda filename: filename.endswith(".java"), os.listdir(self.pkg_dir)))
-        return list(map(lambda filename: filename.removesuffix(".java"), filenames))
+        if self.symbols is not None:
+            return list(self.symbols.class_names(self.package_name))
+        with profiler.phase("listing"):
+            return self.source.class_names(self.package_name)
 
     def read_class_file(self, name: str) -> str:
-        filename = self.pkg_dir + name + ".java"
-        return open(filename, "r").read()
+        return self.source.read(self.package_name, name)
+
+    def source_digest(self, name: str) -> str:
+        """
+        :return: digest of the class source, taken from the index when the package is read from one
+        """
+        if isinstance(self.source, ApiIndex):
+            return self.source.source_digest(self.package_name, name)
+        return source_digest(self.read_class_file(name))
 
     def parse_class(self, name: str) -> Union[KlassFile,None]:
-        try:
-            jlang = javalang.parse.parse(self.read_class_file(name))
-            return KlassFile(jlang, klass_name=name)
-        except javalang.parser.JavaSyntaxError as exception:
+        """
+        Parse class, reusing the run's parse cache when the package has one
+        :param name: class name
+        :return: KlassFile or None if the class could not be parsed
+        """
+        if self.parse_cache is None:
+            return self._parse_class(name)
+        return self.parse_cache.get(self.package_name, name, self._parse_class)
+
+    def _parse_class(self, name: str) -> Union[KlassFile,None]:
+        if isinstance(self.source, ApiIndex):
+            with profiler.phase("index", klass=self.package_name + "." + name):
+                klassfile = self.source.load_class(self.package_name, name)
+            if klassfile is None:
+                sys.stderr.write(f"could not parse class {name}\n")
+            return klassfile
+        source = self.read_class_file(name)
+        disk_cache = self.parse_cache.disk_cache if self.parse_cache is not None else None
+        if disk_cache is not None:
+            klassfile = disk_cache.load(name, source)
+            if klassfile is not None:
+                return klassfile
+
+        fast = self.parse_cache.fast if self.parse_cache is not None else False
+        with profiler.phase("parse", klass=self.package_name + "." + name):
+            klassfile = parse_source(name, source, fast=fast)
+        if klassfile is None:
             sys.stderr.write(f"could not parse class {name}\n")
             return None
 
+        if disk_cache is not None:
+            disk_cache.store(name, source, klassfile)
+        return klassfile
+
+    def prefetch_classes(self, names: List[str]):
+        """
+        Parse classes in the parse cache's worker pool, so later parse_class calls are cache hits
+        Results are stored by class name, which keeps the generated output identical to a serial run
+        :param names: class names
+        """
+        if self.parse_cache is None or self.parse_cache.pool is None or isinstance(self.source, ApiIndex):
+            return
+        disk_cache = self.parse_cache.disk_cache
+
+        pending_names = []
+        pending_sources = []
+        for name in names:
+            if (self.package_name, name) in self.parse_cache:
+                continue
+            source = self.read_class_file(name)
+            if disk_cache is not None:
+                klassfile = disk_cache.load(name, source)
+                if klassfile is not None:
+                    self.parse_cache.put(self.package_name, name, klassfile)
+                    continue
+            pending_names.append(name)
+            pending_sources.append(source)
+
+        if len(pending_names) == 0:
+            return
+        chunksize = max(1, len(pending_names) // (self.parse_cache.jobs * 4))
+        parse = functools.partial(parse_source, fast=self.parse_cache.fast)
+        results = self.parse_cache.pool.map(parse, pending_names, pending_sources, chunksize=chunksize)
+        with profiler.phase("parse"):
+            results = list(results)
+        for name, source, klassfile in zip(pending_names, pending_sources, results):
+            if klassfile is None:
+                sys.stderr.write(f"could not parse class {name}\n")
+            elif disk_cache is not None:
+                disk_cache.store(name, source, klassfile)
+            self.parse_cache.put(self.package_name, name, klassfile)
+
+    def release_class(self, name: str):
+        """
+        Drop parsed class from the parse cache, the next parse_class call parses it again
+        """
+        if self.parse_cache is not None:
+            self.parse_cache.release(self.package_name, name)
+
     @property
     def class_names(self):
         return self.list_class_names()
@@ -42,8 +155,26 @@ class Package(object):
 
 
 class PackageTemplateHelper(object):
-    def __init__(self, package: Package):
+    # classes parsed ahead at a time (by the worker pool) while skeletons are taken without batches
+    stream_chunk_size = 64
+
+    def __init__(self, package: Package, release: bool = False, batch_size: Union[int, None] = None,
+                 monitor: Union[MemoryMonitor, None] = None):
+        """
+        :param package: package to render
+        :param release: stream the package: order and imports come from class skeletons, each class file is
+                        loaded when its turn comes and dropped from the parse cache once the template has emitted it
+        :param batch_size: parse and emit classes in batches of this many, only keeping a skeleton of each class
+                           in between. Parsed classes are loaded again from the parse cache's disk cache to be
+                           emitted, so it needs one. None holds the whole package.
+        :param monitor: measures batches and keeps memory below its ceiling
+        """
         self.package = package
+        self.release = release
+        self.batch_size = batch_size
+        self.monitor = monitor if monitor is not None else MemoryMonitor()
+        self._klass_order = None  # type: Union[List[str], None]
+        self._skeletons = None  # type: Union[List[KlassFile], None]
 
     @property
     def klass_names(self):
@@ -51,25 +182,110 @@ class PackageTemplateHelper(object):
 
     @property
     def klasses(self):
-        klasses = []
-        for class_name in self.klass_names:
-            # HACK: need to put classes with inheritances last
+        if self.release:
+            klasses = self.emit_klasses()
+        else:
+            klasses = self.ordered_klasses()
+        if profiler.enabled:
+            return self.profile_klasses(klasses)
+        return klasses
 
-            klassfile = self.package.parse_class(class_name)
-            if klassfile is None:
-                continue
+    def profile_klasses(self, klasses):
+        """
+        Attribute the time the template spends between two classes to the class it just received
+        """
+        for klassfile in klasses:
+            profiler.current_klass = self.package.package_name + "." + klassfile.klass_name
+            with profiler.phase("render"):
+                yield klassfile
+        profiler.current_klass = None
 
-            inheritance = klassfile.klass.inheritance
-            if len(inheritance) == 1 and inheritance[0] == "object":
-                klasses.insert(0, klassfile)
-            else:
-                klasses.append(klassfile)
+    def emit_klasses(self):
+        """
+        Yield class files in render order, each class is loaded when its turn comes and released once the template
+        moves on, so only one parsed class is held at a time. With batches the classes are measured batch by batch.
+        """
+        klass_names = self.klass_order()
+        if self.batch_size is None:
+            for class_name in klass_names:
+                klassfile = self.package.parse_class(class_name)
+                yield klassfile
+                self.package.release_class(class_name)
+                del klassfile
+            return
+        batch_size = self.monitor.batch_size(self.batch_size)
+        position = 0
+        while position < len(klass_names):
+            batch = klass_names[position:position + batch_size]
+            position += len(batch)
+            with self.monitor.phase("render"):
+                for class_name in batch:
+                    klassfile = self.package.parse_class(class_name)
+                    yield klassfile
+                    self.package.release_class(class_name)
+                    del klassfile
+            batch_size = self.monitor.adjust(batch_size)
 
-        return klasses
+    def klass_order(self) -> List[str]:
+        """
+        Class names in render order, computed from class skeletons parsed in batches (stream_chunk_size classes
+        without batches). Each batch is released once its skeletons are taken.
+        """
+        if self._klass_order is not None:
+            return self._klass_order
+        klass_names = self.klass_names
+        graph = InheritanceGraph(self.package.symbols if self.package.symbols is not None
+                                 else SymbolIndex.from_package(self.package.package_name, klass_names))
+        batch_size = self.monitor.batch_size(self.batch_size) if self.batch_size is not None \
+            else self.stream_chunk_size
+        position = 0
+        while position < len(klass_names):
+            batch = klass_names[position:position + batch_size]
+            position += len(batch)
+            with self.monitor.phase("parse"):
+                self.package.prefetch_classes(batch)
+                for class_name in batch:
+                    klassfile = self.package.parse_class(class_name)
+                    if klassfile is not None and klassfile.klass is not None:
+                        graph.add(self.package.package_name, klassfile.skeleton())
+                    self.package.release_class(class_name)
+                del klassfile
+            if self.batch_size is not None:
+                batch_size = self.monitor.adjust(batch_size)
+        self._skeletons = graph.order()
+        self._klass_order = [skeleton.klass_name for skeleton in self._skeletons]
+        return self._klass_order
+
+    def ordered_klasses(self):
+        """
+        Parsed class files of the package, base classes ahead of the classes extending them
+        The order is computed once, so diagnostics are reported once per package
+        """
+        if self._klass_order is None and (self.release or self.batch_size is not None):
+            self.klass_order()
+        if self._klass_order is None:
+            klass_names = self.klass_names
+            self.package.prefetch_classes(klass_names)
+            graph = InheritanceGraph(self.package.symbols if self.package.symbols is not None
+                                     else SymbolIndex.from_package(self.package.package_name, klass_names))
+            for class_name in klass_names:
+                klassfile = self.package.parse_class(class_name)
+                if klassfile is None or klassfile.klass is None:
+                    continue
+                graph.add(self.package.package_name, klassfile)
+            klasses = graph.order()
+            self._klass_order = [klassfile.klass_name for klassfile in klasses]
+            return klasses
+        return [self.package.parse_class(class_name) for class_name in self._klass_order]
 
     @property
     def imports(self):
-        for klassfile in self.klasses:
+        if self.release or self.batch_size is not None:
+            self.klass_order()
+            klasses = self._skeletons
+        else:
+            klasses = self.ordered_klasses()
+        for klassfile in klasses:
             for imp in klassfile.imports:
                 yield imp
 
@@ -0,0 +1,257 @@
+"""
+Pipelined generation: reading, parsing and rendering run as concurrent stages connected by bounded queues
+
+    reader thread   sources of all packages, in package order
+    parser thread   disk cache, then the parse pool (or the thread itself with one job)
+    main thread     renders every class as soon as it is parsed, and writes a package once all of its classes are in
+
+Only the rendered text and a skeleton of each class (name, imports, inheritance) are kept until the package is
+complete, the class model itself is dropped after rendering. The queues bound how many sources and models are in
+flight. A package module is put together like class.txt does it: header.txt, a blank line and klass.txt for every
+class in inheritance order, a stub like stub.txt: stub_header.txt followed by stub_klass.txt for every class.
+"""
+import collections
+import datetime
+import os
+import queue
+import sys
+import threading
+from typing import Callable, Dict, List, Union
+
+from docresource import DocumentationResource
+from inheritance import InheritanceGraph
+from klass import KlassFile
+from manifest import OutputFiles
+from package import PackageTemplateHelper, parse_source
+from profiling import profiler
+
+_done = object()
+
+
+class PackageState(object):
+    """
+    Rendered classes of a package that is not complete yet
+    """
+    def __init__(self, package, renderer, expected: int, docs: Union[str, None] = None):
+        """
+        :param docs: documentation level of the slim build's documentation resource, None without one
+        """
+        self.package = package
+        self.renderer = renderer
+        self.helper = PackageTemplateHelper(package)
+        self.expected = expected
+        self.received = 0
+        self.skeletons = {}  # type: Dict[str, KlassFile]
+        self.modules = {}  # type: Dict[str, str]
+        self.stubs = {}  # type: Dict[str, str]
+        self.resource = DocumentationResource(package.package_name, docs) if docs is not None else None
+
+    @property
+    def complete(self):
+        return self.received == self.expected
+
+
+class Pipeline(object):
+    def __init__(self, j2p, outputs: OutputFiles, module: bool = True, stub: bool = False, split: bool = False,
+                 queue_size: int = 64, docs: Union[str, None] = None):
+        """
+        :param j2p: JavaToPython, its parse cache supplies the disk cache, the worker pool and the parse mode
+        :param outputs: OutputFiles to write through
+        :param module: write the runtime module (one module per class with split)
+        :param stub: write a .pyi stub next to the module
+        :param split: write one module per class and a lazily importing __init__.py
+        :param queue_size: sources and parsed classes in flight at most
+        :param docs: documentation level of the documentation resource written next to slim modules, None for none
+        """
+        self.j2p = j2p
+        self.outputs = outputs
+        self.module = module
+        self.stub = stub
+        self.split = split
+        self.queue_size = queue_size
+        self.docs = docs
+        self.sources = queue.Queue(maxsize=queue_size)
+        self.models = queue.Queue(maxsize=queue_size)
+        self.error = None  # type: Union[BaseException, None]
+        self.outfile = None  # type: Union[Callable[[str], str], None]
+
+    def run(self, package_names: List[str], outfile: Callable[[str], str]):
+        """
+        Generate packages
+        :param package_names: java package names
+        :param outfile: returns the module filename of a package, e.g. <outdir>/burp/__init__.py
+        """
+        self.outfile = outfile
+        reader = threading.Thread(target=self.read, args=(package_names,), name="java2py-read", daemon=True)
+        parser = threading.Thread(target=self.parse, name="java2py-parse", daemon=True)
+        reader.start()
+        parser.start()
+        try:
+            self.render(package_names)
+        except BaseException as exception:
+            if self.error is None:
+                self.error = exception
+        finally:
+            reader.join()
+            parser.join()
+        if self.error is not None:
+            raise self.error
+
+    def put(self, items: queue.Queue, item):
+        """
+        Put item, giving up once a stage failed
+        """
+        while self.error is None:
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def take(self, items: queue.Queue):
+        """
+        Take next item, or the end marker once a stage failed
+        """
+        while self.error is None:
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _done
+
+    def read(self, package_names: List[str]):
+        try:
+            for package_name in package_names:
+                pkg = self.j2p.open_package(package_name)
+                for name in pkg.list_class_names():
+                    self.put(self.sources, (package_name, name, pkg.read_class_file(name)))
+        except BaseException as exception:
+            self.error = exception
+        finally:
+            self.put(self.sources, _done)
+
+    def parse(self):
+        parse_cache = self.j2p.parse_cache
+        disk_cache = parse_cache.disk_cache
+        pending = collections.deque()
+        try:
+            while True:
+                item = self.take(self.sources)
+                if item is _done:
+                    break
+                package_name, name, source = item
+                klassfile = disk_cache.load(name, source) if disk_cache is not None else None
+                if klassfile is not None:
+                    pending.append((package_name, name, source, klassfile, False))
+                elif parse_cache.pool is not None:
+                    future = parse_cache.pool.submit(parse_source, name, source, parse_cache.fast)
+                    pending.append((package_name, name, source, future, True))
+                else:
+                    with profiler.phase("parse", klass=package_name + "." + name):
+                        klassfile = parse_source(name, source, fast=parse_cache.fast)
+                    pending.append((package_name, name, source, klassfile, True))
+                while len(pending) > 0 and (len(pending) >= self.queue_size or not self.is_pending(pending[0][3])):
+                    self.forward(pending.popleft())
+            while len(pending) > 0 and self.error is None:
+                self.forward(pending.popleft())
+        except BaseException as exception:
+            self.error = exception
+        finally:
+            self.put(self.models, _done)
+
+    @staticmethod
+    def is_pending(result) -> bool:
+        return hasattr(result, "done") and not result.done()
+
+    def forward(self, entry):
+        package_name, name, source, result, parsed = entry
+        if hasattr(result, "result"):
+            with profiler.phase("parse", klass=package_name + "." + name):
+                result = result.result()
+        disk_cache = self.j2p.parse_cache.disk_cache
+        if result is None:
+            sys.stderr.write(f"could not parse class {name}\n")
+        elif parsed and disk_cache is not None:
+            disk_cache.store(name, source, result)
+        self.put(self.models, (package_name, name, result))
+
+    def render(self, package_names: List[str]):
+        states = {}  # type: Dict[str, PackageState]
+        for package_name in package_names:
+            pkg = self.j2p.open_package(package_name)
+            states[package_name] = PackageState(pkg, self.j2p.get_renderer(pkg), len(pkg.list_class_names()),
+                                                   docs=self.docs)
+        for package_name in package_names:
+            if states[package_name].complete:
+                self.write_package(states.pop(package_name))
+
+        while True:
+            item = self.take(self.models)
+            if item is _done:
+                break
+            package_name, name, klassfile = item
+            state = states[package_name]
+            state.received += 1
+            if klassfile is not None and klassfile.klass is not None:
+                self.render_klass(state, klassfile)
+            del klassfile
+            if state.complete:
+                self.write_package(states.pop(package_name))
+
+        if self.error is None and len(states) > 0:
+            self.error = RuntimeError(f"packages {', '.join(states)} did not receive all classes")
+
+    def render_klass(self, state: PackageState, klassfile: KlassFile):
+        package_name = state.package.package_name
+        klass = klassfile.klass
+        environment = state.renderer.environment
+        profiler.current_klass = package_name + "." + klassfile.klass_name
+        with profiler.phase("render"):
+            if self.module and self.split:
+                directory = os.path.dirname(self.outfile(package_name))
+                template = environment.get_template("module.txt")
+                with self.outputs.open(os.path.join(directory, "_" + klass.name + ".py")) as fp:
+                    template.stream(package=state.helper, klassfile=klassfile, now=datetime.datetime.utcnow,
+                                    docs=state.renderer.docs).dump(fp)
+                    fp.write("\n")
+            elif self.module:
+                state.modules[klassfile.klass_name] = environment.get_template("klass.txt").render(
+                    klassfile=klassfile, docs=state.renderer.docs)
+            if self.stub:
+                state.stubs[klassfile.klass_name] = environment.get_template("stub_klass.txt").render(klassfile=klassfile)
+        if state.resource is not None:
+            state.resource.add(klassfile)
+        # inheritance order and imports only need a skeleton of the class
+        state.skeletons[klassfile.klass_name] = klassfile.skeleton()
+        profiler.current_klass = None
+
+    def write_package(self, state: PackageState):
+        filename = self.outfile(state.package.package_name)
+        graph = InheritanceGraph(self.j2p.symbols)
+        for skeleton in state.skeletons.values():
+            graph.add(state.package.package_name, skeleton)
+        ordered = graph.order()
+        imports = [imp for skeleton in ordered for imp in skeleton.imports]
+        environment = state.renderer.environment
+
+        with profiler.phase("package"):
+            if state.resource is not None:
+                state.resource.write(self.outputs, filename, environment)
+            if self.module and self.split:
+                template = environment.get_template("init.txt")
+                with self.outputs.open(os.path.join(os.path.dirname(filename), "__init__.py")) as fp:
+                    template.stream(klass_names=[skeleton.klass.name for skeleton in ordered],
+                                    now=datetime.datetime.utcnow).dump(fp)
+                    fp.write("\n")
+            elif self.module:
+                with self.outputs.open(filename) as fp:
+                    environment.get_template("header.txt").stream(imports=imports, now=datetime.datetime.utcnow).dump(fp)
+                    fp.write("\n\n")
+                    for skeleton in ordered:
+                        fp.write(state.modules[skeleton.klass_name])
+            if self.stub:
+                with self.outputs.open(os.path.splitext(filename)[0] + ".pyi") as fp:
+                    body = "".join(state.stubs[skeleton.klass_name] for skeleton in ordered)
+                    environment.get_template("stub_header.txt").stream(package=state.helper, imports=imports, body=body,
+                                                                       now=datetime.datetime.utcnow).dump(fp)
+                    fp.write(body)
@@ -0,0 +1,131 @@
+import contextlib
+import functools
+import json
+import sys
+import time
+from typing import Callable, Dict, TextIO, Union
+
+
+class Profiler(object):
+    """
+    Records wall time and call counts per phase and per class, plus named counters such as cache hits
+
+    Disabled by default, a disabled profiler hands out a shared no-op context so instrumented code pays
+    next to nothing. Nested entries into the same phase are only timed once (outermost entry).
+    Rendering a class includes resolving its types and decoding its docs, so only the top level phases
+    add up to the total time of a class.
+    """
+    top_level_phases = ("parse", "render")
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}  # type: Dict[str, Dict[str, float]]
+        self.klasses = {}  # type: Dict[str, Dict[str, float]]
+        self.counters = {}  # type: Dict[str, int]
+        self.current_klass = None  # type: Union[str, None]
+        self._active = {}  # type: Dict[str, int]
+        self._started = None  # type: Union[float, None]
+        self._null = contextlib.nullcontext()
+        self.caches = {}  # type: Dict[str, Callable]
+
+    def enable(self):
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    def phase(self, name: str, klass: Union[str, None] = None):
+        """
+        Context manager timing one call of a phase
+        :param name: phase name
+        :param klass: fully qualified class the time is attributed to, defaults to the class being rendered
+        """
+        if not self.enabled:
+            return self._null
+        return self._phase(name, klass)
+
+    @contextlib.contextmanager
+    def _phase(self, name, klass):
+        depth = self._active.get(name, 0)
+        self._active[name] = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active[name] = depth
+            if depth == 0:
+                self.add(name, time.perf_counter() - started, klass)
+
+    def wrap(self, name: str, function):
+        """
+        Time every call of function as phase name, returns function itself when profiling is disabled
+        """
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+        return profiled
+
+    def add(self, name: str, seconds: float, klass: Union[str, None] = None, calls: int = 1):
+        """
+        Record time spent in a phase, e.g. measured by worker processes
+        """
+        phase = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+        phase["seconds"] += seconds
+        phase["calls"] += calls
+        klass = klass if klass is not None else self.current_klass
+        if klass is not None:
+            klass_phases = self.klasses.setdefault(klass, {})
+            klass_phases[name] = klass_phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def register_cache(self, name: str, function: Callable):
+        """
+        Report hits and misses of an lru_cache decorated function, registering a name again replaces the function
+        """
+        self.caches[name] = function
+
+    def report(self) -> dict:
+        counters = dict(self.counters)
+        for name, function in self.caches.items():
+            info = function.cache_info()
+            counters[name + ".hit"] = info.hits
+            counters[name + ".miss"] = info.misses
+        klasses = {
+            name: dict(phases, total=sum(phases.get(phase, 0.0) for phase in self.top_level_phases))
+            for name, phases in self.klasses.items()
+        }
+        return {
+            "seconds": time.perf_counter() - self._started if self._started is not None else 0.0,
+            "phases": self.phases,
+            "counters": counters,
+            "klasses": dict(sorted(klasses.items(), key=lambda item: item[1]["total"], reverse=True)),
+        }
+
+    def write_report(self, filename: str):
+        with open(filename, "w", encoding="utf-8") as fp:
+            json.dump(self.report(), fp, indent=2)
+
+    def summary(self, fp: TextIO = sys.stderr, top: int = 10):
+        """
+        Write short human readable summary: phases, cache hit rates and the slowest classes
+        """
+        report = self.report()
+        fp.write(f"total {report['seconds']:.3f}s\n")
+        for name, phase in sorted(report["phases"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+            fp.write(f"  {name:<10} {phase['seconds']:>9.3f}s {int(phase['calls']):>8} calls\n")
+        caches = sorted({name.rsplit(".", 1)[0] for name in report["counters"]})
+        for cache in caches:
+            hits = report["counters"].get(cache + ".hit", 0)
+            misses = report["counters"].get(cache + ".miss", 0)
+            if hits + misses > 0:
+                fp.write(f"  {cache:<20} {hits} hits, {misses} misses ({100.0 * hits / (hits + misses):.1f}% hit rate)\n")
+        for name, phases in list(report["klasses"].items())[:top]:
+            fp.write(f"  {phases['total']:>9.3f}s {name}\n")
+
+
+profiler = Profiler()
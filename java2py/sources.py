@@ -0,0 +1,119 @@
+import os
+import zipfile
+from typing import Dict, Iterator, List, Tuple
+
+
+def walk(root: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """
+    os.walk following symlinked directories, such as packages linked into the source directory
+    Directories are visited once by their real path, so symlink cycles end the walk instead of looping
+    """
+    visited = set()
+    for dirpath, dirnames, filenames in os.walk(root, followlinks=True):
+        realpath = os.path.realpath(dirpath)
+        if realpath in visited:
+            dirnames[:] = []
+            continue
+        visited.add(realpath)
+        yield dirpath, dirnames, filenames
+
+
+class DirectorySource(object):
+    """
+    Java sources in a directory tree, one directory per package
+    """
+    def __init__(self, root: str):
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"Could not find source directory {root}")
+        self.root = root
+
+    def packages(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        :return: iterator of (package name, class names) of every directory below root, in listing order
+        """
+        for dirpath, dirnames, filenames in walk(self.root):
+            relpath = os.path.relpath(dirpath, self.root)
+            if relpath == os.curdir:
+                continue
+            package_name = ".".join(relpath.split(os.sep))
+            yield package_name, [filename.removesuffix(".java") for filename in filenames if filename.endswith(".java")]
+
+    def class_names(self, package_name: str) -> List[str]:
+        filenames = os.listdir(self.package_dir(package_name))
+        return [filename.removesuffix(".java") for filename in filenames if filename.endswith(".java")]
+
+    def package_dir(self, package_name: str) -> str:
+        return os.path.join(self.root, *package_name.split("."))
+
+    def read(self, package_name: str, klass_name: str) -> str:
+        with open(os.path.join(self.package_dir(package_name), klass_name + ".java"), "r") as fp:
+            return fp.read()
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return self.root
+
+
+class ArchiveSource(object):
+    """
+    Java sources in a zip archive, such as the JDK's src.zip or a -sources.jar
+
+    Entries are located through the archive's central directory, nothing is extracted.
+    Module directories of the JDK (java.base/java/lang/Object.java) are stripped, directory names of java
+    packages never contain dots.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.archive = zipfile.ZipFile(filename)
+        self.entries = {}  # type: Dict[Tuple[str, str], str]
+        self.index = {}  # type: Dict[str, List[str]]
+        for entry in self.archive.namelist():
+            if not entry.endswith(".java"):
+                continue
+            parts = entry.split("/")
+            if len(parts) > 1 and "." in parts[0]:
+                parts = parts[1:]
+            if len(parts) < 2:
+                continue
+            package_parts = parts[:-1]
+            for i in range(1, len(package_parts)):
+                self.index.setdefault(".".join(package_parts[:i]), [])
+            package_name = ".".join(package_parts)
+            klass_name = parts[-1].removesuffix(".java")
+            if (package_name, klass_name) not in self.entries:
+                self.index.setdefault(package_name, []).append(klass_name)
+            self.entries[(package_name, klass_name)] = entry
+
+    def packages(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        :return: iterator of (package name, class names), in central directory order
+        """
+        return iter(self.index.items())
+
+    def class_names(self, package_name: str) -> List[str]:
+        return list(self.index.get(package_name, []))
+
+    def read(self, package_name: str, klass_name: str) -> str:
+        return self.archive.read(self.entries[(package_name, klass_name)]).decode("utf-8")
+
+    def close(self):
+        self.archive.close()
+
+    def __str__(self):
+        return self.filename
+
+
+def open_source(path: str):
+    """
+    Open java sources in a directory or a zip/jar archive, or an api index written from them
+    """
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if os.path.isfile(path) and zipfile.is_zipfile(path):
+        return ArchiveSource(path)
+    from apiindex import ApiIndex, is_index
+    if os.path.isfile(path) and is_index(path):
+        return ApiIndex(path)
+    raise FileNotFoundError(f"Could not find source directory, archive or api index {path}")
@@ -0,0 +1,98 @@
+from typing import Dict, Iterable, List, Set, Union
+
+from common import Import
+from sources import DirectorySource
+
+from profiling import profiler
+
+
+class SymbolIndex(object):
+    """
+    Index of the packages and classes found in a java source tree
+
+    Built from a single walk of the source directory, so resolving a type is a dictionary lookup
+    instead of listing package directories for every type reference.
+    """
+    def __init__(self):
+        self.packages = {}  # type: Dict[str, List[str]]
+        self.qualified_names = {}  # type: Dict[str, List[str]]
+        self._members = {}  # type: Dict[str, Set[str]]
+
+    @classmethod
+    def from_source(cls, source) -> "SymbolIndex":
+        """
+        Index every package and class of a source provider
+        :param source: DirectorySource or ArchiveSource
+        :return: SymbolIndex
+        """
+        index = cls()
+        with profiler.phase("listing"):
+            for package_name, class_names in source.packages():
+                index.add_package(package_name, class_names)
+        return index
+
+    @classmethod
+    def from_directory(cls, source_dir: str) -> "SymbolIndex":
+        """
+        Walk source directory and index every package (directory) and class (.java file)
+        :param source_dir: root of the java source tree
+        :return: SymbolIndex
+        """
+        return cls.from_source(DirectorySource(source_dir))
+
+    @classmethod
+    def from_package(cls, package_name: str, class_names: List[str]) -> "SymbolIndex":
+        """
+        Index of a single package, for packages opened without the index of their source tree
+        """
+        index = cls()
+        index.add_package(package_name, class_names)
+        return index
+
+    def add_package(self, package_name: str, class_names: List[str]):
+        self.packages[package_name] = list(class_names)
+        self._members[package_name] = set(class_names)
+        for class_name in class_names:
+            self.qualified_names.setdefault(class_name, []).append(package_name + "." + class_name)
+
+    def has_package(self, package_name: str) -> bool:
+        return package_name in self.packages
+
+    def class_names(self, package_name: str) -> List[str]:
+        """
+        :return: class names of package, in directory listing order
+        """
+        return self.packages[package_name]
+
+    def has_class(self, package_name: str, class_name: str) -> bool:
+        members = self._members.get(package_name)
+        return members is not None and class_name in members
+
+    def lookup(self, class_name: str) -> List[str]:
+        """
+        :return: fully qualified names of all classes with this simple name
+        """
+        return self.qualified_names.get(class_name, [])
+
+    def qualify(self, package_name: str, name: str, imports: Iterable[Import] = ()) -> Union[str, None]:
+        """
+        Fully qualified name of a class referenced from package_name, looked up like javac does:
+        qualified names as is, then classes of the same package, then imported classes
+        :param package_name: package of the referencing class
+        :param name: simple or qualified class name
+        :param imports: imports of the referencing class file
+        :return: qualified name or None if the class is not part of the source tree
+        """
+        if "." in name:
+            return name
+        if self.has_class(package_name, name):
+            return package_name + "." + name
+        for imp in imports:
+            if imp.static:
+                continue
+            if imp.wildcard:
+                if self.has_class(imp.package_name, name):
+                    return imp.package_name + "." + name
+            elif imp.path.endswith("." + name):
+                return imp.path
+        return None
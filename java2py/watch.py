@@ -0,0 +1,280 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
+
+from klass import KlassFile
+from sources import walk
+from symbols import SymbolIndex
+
+
+class PollingWatcher(object):
+    """
+    Detects changed files by comparing modification time and size of every file below the watched directories
+    """
+    def __init__(self, directories: List[str], interval: float = 0.25):
+        self.directories = directories
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            for dirpath, dirnames, filenames in walk(directory):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Union[float, None] = None) -> Set[str]:
+        """
+        Block until files change
+        :param timeout: seconds to wait at most, None waits forever
+        :return: paths of changed, created and deleted files, empty on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if len(changed) > 0 or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detects changed files with linux inotify, directories created later are watched as well
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    event_header = struct.Struct("iIII")
+    # editors save in several steps, collect the events that follow within this many seconds
+    settle = 0.02
+
+    def __init__(self, directories: List[str]):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # type: Dict[int, str]
+        for directory in directories:
+            self.add_tree(directory)
+
+    def add_tree(self, directory: str):
+        for dirpath, dirnames, filenames in walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"could not watch {dirpath}")
+            self.watches[wd] = dirpath
+
+    def read_events(self, changed: Set[str]):
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.event_header.unpack_from(data, offset)
+            offset += self.event_header.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if wd not in self.watches:
+                continue
+            path = os.path.join(self.watches[wd], name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self.add_tree(path)
+                    for dirpath, dirnames, filenames in walk(path):
+                        changed.update(os.path.join(dirpath, filename) for filename in filenames)
+                continue
+            changed.add(path)
+
+    def wait(self, timeout: Union[float, None] = None) -> Set[str]:
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while len(readable) > 0:
+            self.read_events(changed)
+            readable, _, _ = select.select([self.fd], [], [], self.settle)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(directories: List[str]):
+    """
+    Watch directories with inotify, or by polling where inotify is not available
+    """
+    try:
+        return InotifyWatcher(directories)
+    except (OSError, AttributeError) as exception:
+        sys.stderr.write(f"inotify not available ({exception}), polling for changes\n")
+        return PollingWatcher(directories)
+
+
+class DependencyGraph(object):
+    """
+    Which classes refer to which other classes, through imports and inheritance
+
+    Classes are identified by their fully qualified name.
+    """
+    def __init__(self, symbols: SymbolIndex):
+        self.symbols = symbols
+        self.dependencies = {}  # type: Dict[str, Set[str]]
+        self.dependents = {}  # type: Dict[str, Set[str]]
+        self.bases = {}  # type: Dict[str, Set[str]]
+
+    def update(self, package_name: str, klassfile: Union[KlassFile, None], klass_name: str):
+        """
+        Replace the outgoing references of a class
+        """
+        qualified_name = package_name + "." + klass_name
+        self.remove(qualified_name)
+        if klassfile is None:
+            return
+        dependencies = {imp.path for imp in klassfile.imports if not imp.wildcard and not imp.static}
+        bases = set()
+        if klassfile.klass is not None:
+            for base in klassfile.klass.inheritance:
+                qualified_base = self.symbols.qualify(package_name, base, klassfile.imports)
+                if qualified_base is not None:
+                    bases.add(qualified_base)
+        dependencies |= bases
+        self.dependencies[qualified_name] = dependencies
+        self.bases[qualified_name] = bases
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, set()).add(qualified_name)
+
+    def remove(self, qualified_name: str):
+        for dependency in self.dependencies.pop(qualified_name, ()):
+            self.dependents.get(dependency, set()).discard(qualified_name)
+        self.bases.pop(qualified_name, None)
+
+    def affected(self, qualified_names: Iterable[str]) -> Set[str]:
+        """
+        Classes whose generated code may change with the given classes
+        That is the classes themselves, the classes referring to them and, transitively, everything inheriting from them
+        """
+        affected = set(qualified_names)
+        pending = list(affected)
+        while len(pending) > 0:
+            qualified_name = pending.pop()
+            for dependent in self.dependents.get(qualified_name, ()):
+                if dependent in affected:
+                    continue
+                affected.add(dependent)
+                if qualified_name in self.bases.get(dependent, ()):
+                    pending.append(dependent)
+        return affected
+
+
+def watch(j2p, package_names: List[str], template_dir: str,
+          regenerate: Callable[[Dict[str, Union[Set[str], None]]], None], partial: bool = True):
+    """
+    Regenerate packages whenever sources or templates change, until interrupted
+
+    Only changed source files are parsed again. Templates changes and added or removed classes (which change how
+    types resolve) regenerate every package, otherwise only the classes affected by the changed files.
+    :param j2p: JavaToPython with the initial run's parse cache, classes must not have been released
+    :param package_names: generated java packages
+    :param template_dir: template directory
+    :param regenerate: called with {package name: class names to render, or None for every class}
+    :param partial: regenerate can render some classes of a package (one module per class), otherwise the packages
+                    of the affected classes are rendered in full
+    """
+    source_dir = os.path.abspath(j2p.source_dir)
+    template_dir = os.path.abspath(template_dir)
+    directories = [source_dir, template_dir]
+    watcher = create_watcher(directories)
+
+    graph = DependencyGraph(j2p.symbols)
+    for package_name in package_names:
+        pkg = j2p.open_package(package_name)
+        for klass_name in pkg.list_class_names():
+            graph.update(package_name, pkg.parse_class(klass_name), klass_name)
+
+    sys.stderr.write(f"watching {j2p.source_dir} and {template_dir}\n")
+    try:
+        while True:
+            changed = watcher.wait()
+            started = time.perf_counter()
+
+            templates_changed = False
+            changed_klasses = []  # type: List[Tuple[str, str]]
+            for path in sorted(changed):
+                path = os.path.abspath(path)
+                if path.startswith(template_dir + os.sep):
+                    templates_changed = True
+                elif path.startswith(source_dir + os.sep) and path.endswith(".java"):
+                    relpath = os.path.relpath(path, source_dir)
+                    package_name = ".".join(os.path.dirname(relpath).split(os.sep))
+                    changed_klasses.append((package_name, os.path.basename(relpath).removesuffix(".java")))
+            if not templates_changed and len(changed_klasses) == 0:
+                continue
+
+            symbols_changed = any(os.path.exists(os.path.join(source_dir, *package_name.split("."), klass_name + ".java"))
+                                  != j2p.symbols.has_class(package_name, klass_name)
+                                  for package_name, klass_name in changed_klasses)
+            if symbols_changed:
+                j2p.reload_symbols()
+                graph.symbols = j2p.symbols
+            if templates_changed:
+                j2p.reload_templates()
+
+            for package_name, klass_name in changed_klasses:
+                j2p.parse_cache.release(package_name, klass_name)
+                if package_name in package_names and j2p.symbols.has_class(package_name, klass_name):
+                    graph.update(package_name, j2p.open_package(package_name).parse_class(klass_name), klass_name)
+                else:
+                    graph.remove(package_name + "." + klass_name)
+
+            if templates_changed or symbols_changed:
+                targets = {package_name: None for package_name in package_names}
+                count = sum(len(j2p.symbols.class_names(package_name)) for package_name in package_names)
+            else:
+                targets = {}
+                affected = graph.affected(f"{package_name}.{klass_name}" for package_name, klass_name in changed_klasses)
+                for qualified_name in affected:
+                    package_name, _, klass_name = qualified_name.rpartition(".")
+                    if package_name in package_names and j2p.symbols.has_class(package_name, klass_name):
+                        targets.setdefault(package_name, set()).add(klass_name)
+                if not partial:
+                    targets = {package_name: None for package_name in targets}
+                count = sum(len(klass_names) if klass_names is not None else len(j2p.symbols.class_names(package_name))
+                            for package_name, klass_names in targets.items())
+            if len(targets) == 0:
+                continue
+
+            try:
+                regenerate(targets)
+            except Exception as exception:
+                # sources are often broken halfway through an edit, keep watching
+                sys.stderr.write(f"regenerating failed: {exception!r}\n")
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            sys.stderr.write(f"regenerated {count} classes in {len(targets)} packages in {elapsed:.0f}ms\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -1,11 +1,12 @@
-from setuptools import setup
+from setuptools import setup, find_packages
 description = "Burp interface with typing hints"
 readme = open("README.rst").read()
 
 setup(
     name='burp',
     version='1.27',
-    packages=['burp'],
+    packages=find_packages(include=['burp', 'java', 'java.*']),
+    package_data={'': ['*.pyi', '*.docs.json.gz']},
     url='https://github.com/elnerd/burp-interfaces',
     license='MIT',
     author='Erlend Leiknes',
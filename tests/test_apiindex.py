@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+from apiindex import ApiIndex
+from java2py import JavaToPython
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = {
+    "demo/IGenerator.java": """package demo;
+public interface IGenerator {
+    int yield(int value);
+    void def_();
+}
+""",
+    "other/Unindexed.java": "package other;\npublic interface Unindexed {\n}\n",
+}
+
+
+def write_index(tmp_path):
+    for filename, source in SOURCES.items():
+        path = tmp_path.joinpath("sources", filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    index = str(tmp_path.joinpath("api.db"))
+    j2p = JavaToPython(str(tmp_path.joinpath("sources")))
+    j2p.write_index(index, ["demo"])
+    j2p.close()
+    return index
+
+
+def test_methods_indexed_by_java_name(tmp_path):
+    index = write_index(tmp_path)
+    with sqlite3.connect(index) as connection:
+        assert sorted(name for name, in connection.execute("SELECT name FROM methods")) == ["def_", "yield"]
+    api = ApiIndex(index)
+    methods = api.load_class("demo", "IGenerator").klass.methods
+    api.close()
+    assert [(method.name, method.java_name) for method in methods] == [("yield_", "yield"), ("def_", "def_")]
+
+
+def test_listed_package_rejected(tmp_path):
+    index = write_index(tmp_path)
+    process = subprocess.run([sys.executable, os.path.join("java2py", "java2py.py"), "--index", index,
+                              "--package", "other", "--outfile", str(tmp_path.joinpath("other.py"))],
+                             cwd=ROOT, capture_output=True, text=True)
+    assert process.returncode == 2
+    assert "packages listed but not indexed" in process.stderr
+    assert "LookupError" not in process.stderr
@@ -0,0 +1,128 @@
+"""
+The method documentation decoder against the search-and-cut decoder it replaced
+"""
+import html
+import random
+import re
+
+import pytest
+
+from doc import MethodDocumentationTemplateFacade
+from klass import Klass
+from method import Method
+
+
+class BaselineMethodDocumentation(object):
+    """
+    The former decoder: cleans up and unquotes the comment, then searches the whole comment again after every cut
+    """
+    re_block = re.compile(r"^\/\*+(?P<body>.*?)\*\/$", re.S)
+    re_stars = re.compile(r"^\s*\*[\t ]*", re.M)
+    re_params = re.compile(r"@param\s+(?P<parameter_name>[a-zA-Z0-9_]+)\s+(?P<parameter_comment>.*?)(?:(?=\n@)|$)",
+                           re.S)
+    re_return = re.compile(r"@return\s+(?P<return_comment>.*?)(?:(?=\n@)|$)", re.S)
+    re_exception = re.compile(r"@exception\s+(?P<exception>[a-zA-Z0-9]+)\s+(?P<exception_comment>.*?)(?:(?=\n@)|$)",
+                              re.S)
+    re_double_newlines = re.compile(r"((\r\n)|(\n)){3,}", re.S)
+
+    def __init__(self, docstr):
+        self.parameters = []
+        self.return_type = None
+        self.exceptions = []
+        s = docstr.strip()
+        if s.startswith("/*"):
+            s = self.re_stars.sub("", self.re_block.match(s).group("body"))
+        elif s.startswith("//"):
+            s = s.replace("//", "", 1)
+        while (unquoted := html.unescape(s)) != s:
+            s = unquoted
+        while True:
+            match = self.re_params.search(s)
+            if match is None:
+                break
+            self.parameters.append((match.group("parameter_name"), match.group("parameter_comment")))
+            s = s[:match.start()] + s[match.end():]
+        match = self.re_return.search(s)
+        if match is not None:
+            self.return_type = match.group("return_comment")
+            s = s[:match.start()] + s[match.end():]
+        while True:
+            match = self.re_exception.search(s)
+            if match is None:
+                break
+            self.exceptions.append((match.group("exception"), match.group("exception_comment")))
+            s = s[:match.start()] + s[match.end():]
+        self.new_docstr = self.re_double_newlines.sub("", s)
+
+
+def assert_same(docstr):
+    expected = BaselineMethodDocumentation(docstr)
+    facade = MethodDocumentationTemplateFacade(docstr)
+    assert facade.to_string() == expected.new_docstr
+    assert [(param._key, param.value) for param in facade.parameters] == expected.parameters
+    assert (facade.return_type and facade.return_type.value) == expected.return_type
+    assert [(exception._key, exception.value) for exception in facade.exceptions] == expected.exceptions
+
+
+ADJACENT_TAGS = [
+    "@param x@param a b\n@return z",
+    "@param x@param y@param a b\n@end",
+    "@return@param a b\n@foo",
+    "@param x\n@param a b\n@return z\n",
+    "@param a b\n@param x\n",
+    "@param x \n@return z",
+    "@param x\n\n@param a b",
+    "@return \n",
+    "@return\n",
+    "@return x\n",
+    "@param a\n",
+    "@param a",
+    "@param a ",
+    "\n@param a b\n",
+    "text\n@param a b\n@exception E bad\n@throws IOException when\n",
+    "@exception E@param a b\n@exception F c",
+    "@param a @param b c\n@return @return r",
+    "@param\n@param a b",
+    "@parameter a b\n@param c d",
+    "@param a b\n\n\n\ntext\n@return r",
+    "@param a_1 b\r\n@return r\r\n",
+    "{@link Foo} @param a b @return r",
+]
+
+
+@pytest.mark.parametrize("comment", ADJACENT_TAGS)
+def test_adjacent_tags(comment):
+    assert_same(comment)
+
+
+def test_decoded_sections():
+    javadoc = MethodDocumentationTemplateFacade("Sends it\n@param x@param a b\n@return z\n@throws IOException when it fails")
+    assert [(param._key, param.value) for param in javadoc.parameters] == [("a", "b"), ("x", "@return z")]
+    assert javadoc.return_type is None
+    assert javadoc.exceptions == []
+    assert javadoc.to_string() == "Sends it\n\n@throws IOException when it fails"
+
+
+TOKENS = ["@param", "@return", "@exception", "@throws", "@see", "x", "E", "a b", " ", "  ", "\n", "\n\n", "\r\n",
+          "\t", "@", ".", "text", "&amp;", "&#64;", "\n * "]
+
+
+def test_fuzzed_comments():
+    generator = random.Random(1)
+    for _ in range(20000):
+        body = "".join(generator.choice(TOKENS) for _ in range(generator.randint(0, 14)))
+        assert_same(body)
+        assert_same(f"/**\n * {body}\n */")
+
+
+def test_documentation_levels_side_by_side():
+    method = Method("send", (), None, (), ("self",), "/**\n * Sends it. Then waits.\n * @param x the x\n */")
+    klass = Klass("A", (), (method,), (), ("object",), "/**\n * A class. With details.\n */")
+    for _ in range(2):
+        assert klass.documentation_at("none") is None
+        assert str(klass.documentation_at("summary")) == "A class."
+        assert str(klass.documentation_at("full")).strip() == "A class. With details."
+        assert method.documentation_at("none") is None
+        assert str(method.documentation_at("summary")) == "Sends it."
+        assert method.documentation_at("summary").parameters == []
+        assert [param.value for param in method.documentation_at("full").parameters] == ["the x\n "]
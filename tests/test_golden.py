@@ -0,0 +1,49 @@
+"""
+The emitter has to render every stock template exactly like jinja, see benchmarks/golden.py
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import doc  # noqa: E402
+import golden  # noqa: E402
+from emitter import TEMPLATES_DIGEST, templates_digest  # noqa: E402
+from java2py import JavaToPython  # noqa: E402
+from synthetic import SyntheticApi  # noqa: E402
+
+SOURCES_DIR = os.path.join(ROOT, "sources")
+
+
+@pytest.fixture(scope="module", params=["synthetic", "sources"])
+def source_tree(request, tmp_path_factory):
+    """
+    :return: (JavaToPython, package names) of a stock source tree
+    """
+    if request.param == "synthetic":
+        source_dir = str(tmp_path_factory.mktemp("synthetic"))
+        package_names = SyntheticApi().write(source_dir)
+        j2p = JavaToPython(source_dir)
+    else:
+        j2p = JavaToPython(SOURCES_DIR)
+        package_names = j2p.find_packages("burp")
+        if not package_names:
+            j2p.close()
+            pytest.skip("sources/ is not populated, run git submodule update --init")
+    yield j2p, package_names
+    j2p.close()
+
+
+def test_templates_digest():
+    assert templates_digest(golden.TEMPLATE_DIR) == TEMPLATES_DIGEST, \
+        "templates/ changed, update the emitter and emitter.TEMPLATES_DIGEST"
+
+
+@pytest.mark.parametrize("level", doc.DOCUMENTATION_LEVELS)
+def test_emitter_matches_templates(source_tree, level, capsys):
+    j2p, package_names = source_tree
+    failures = golden.check(j2p, package_names, level)
+    assert failures == 0, capsys.readouterr().out
@@ -0,0 +1,31 @@
+import os
+
+from manifest import OutputFiles
+
+
+def write(filename, content):
+    with open(filename, "w", encoding="utf-8") as fp:
+        fp.write(content)
+
+
+def test_hand_written_files_are_not_replaceable(tmp_path):
+    filename = str(tmp_path / "__init__.py")
+    outputs = OutputFiles()
+    assert outputs.replaceable(filename)
+    write(filename, "")
+    assert outputs.replaceable(filename)
+    write(filename, "# Autogenerated 2020-01-02 03:04:05\n")
+    assert outputs.replaceable(filename)
+    write(filename, "from .burp import *\n")
+    assert not outputs.replaceable(filename)
+    assert OutputFiles(generated=[filename]).replaceable(filename)
+
+
+def test_files_written_by_the_run_are_replaceable(tmp_path):
+    filename = str(tmp_path / "__init__.py")
+    outputs = OutputFiles()
+    with outputs.open(filename) as fp:
+        fp.write("custom template output\n")
+    assert os.path.exists(filename)
+    assert outputs.replaceable(filename)
+    assert not OutputFiles().replaceable(filename)
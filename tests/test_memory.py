@@ -0,0 +1,103 @@
+import io
+import os
+import re
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+import memory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import SyntheticApi  # noqa: E402
+
+re_autogenerated = re.compile(rb"^# Autogenerated .*$", re.M)
+
+
+def test_peak_rss():
+    assert memory.peak_rss() > 0
+
+
+def test_report_without_resource(monkeypatch):
+    # windows has no resource module
+    monkeypatch.setitem(sys.modules, "resource", None)
+    assert memory.peak_rss() is None
+    monitor = memory.MemoryMonitor()
+    with monitor.phase("parse"):
+        pass
+    assert monitor.report()["peak_rss_kb"] is None
+    fp = io.StringIO()
+    monitor.summary(fp)
+    assert fp.getvalue().startswith("peak rss unknown\n")
+
+
+def test_halved_batches(monkeypatch):
+    rss = iter([300, 300, 250, 250, 400, 400])
+    monkeypatch.setattr(memory, "current_rss", lambda: next(rss))
+    monitor = memory.MemoryMonitor(limit=200)
+    assert monitor.adjust(8) == 4
+    # above the limit, but within the memory the process already holds
+    assert monitor.adjust(4) == 4
+    assert monitor.adjust(4) == 2
+    assert monitor.batch_size(8) == 2
+    assert monitor.report()["batches_shrunk"] == 2
+
+
+def test_memory_limit_exceeded(monkeypatch):
+    rss = iter([300, 300, 400, 400])
+    monkeypatch.setattr(memory, "current_rss", lambda: next(rss))
+    monitor = memory.MemoryMonitor(limit=200)
+    assert monitor.adjust(2) == 1
+    with pytest.raises(memory.MemoryLimitExceeded):
+        monitor.adjust(2)
+
+
+def test_traced_phases_snapshot_per_run(monkeypatch):
+    monitor = memory.MemoryMonitor(trace=True)
+    snapshots = []
+    take_snapshot = monitor.take_snapshot
+    monkeypatch.setattr(monitor, "take_snapshot", lambda: snapshots.append(None) or take_snapshot())
+    try:
+        for phase in ("parse", "parse", "parse", "render", "render"):
+            with monitor.phase(phase):
+                kept = [str(i) for i in range(1000)]
+        report = monitor.report()
+    finally:
+        tracemalloc.stop()
+    assert len(snapshots) == 2
+    assert kept
+    assert report["phases"]["parse"]["batches"] == 3
+    assert report["phases"]["render"]["traced_peak_kb"] > 0
+
+
+def write_outputs(source_dir, package_names, outroot, *options):
+    script = os.path.join(ROOT, "java2py", "java2py.py")
+    runs = {
+        "module": ["--outdir", os.path.join(outroot, "module")],
+        "split": ["--outdir", os.path.join(outroot, "split"), "--split"],
+        "stub": ["--outdir", os.path.join(outroot, "stub"), "--format", "stub"],
+        "slim": ["--outfile", os.path.join(outroot, "slim", "module.py"), "--slim"],
+    }
+    os.makedirs(os.path.join(outroot, "slim"))
+    for name, arguments in runs.items():
+        packages = package_names[:1] if name == "slim" else package_names
+        subprocess.run([sys.executable, script, "--sourcedir", source_dir, "--package", *packages, *arguments,
+                        *options], cwd=ROOT, check=True, capture_output=True)
+    outputs = {}
+    for directory, _, filenames in os.walk(outroot):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            with open(path, "rb") as fp:
+                outputs[os.path.relpath(path, outroot)] = re_autogenerated.sub(b"", fp.read())
+    return outputs
+
+
+def test_batched_output_identical(tmp_path):
+    source_dir = str(tmp_path.joinpath("sources"))
+    package_names = SyntheticApi(packages=2, classes=12).write(source_dir)
+    expected = write_outputs(source_dir, package_names, str(tmp_path.joinpath("unbatched")))
+    assert {path.split(os.sep)[0] for path in expected} == {"module", "split", "stub", "slim"}
+    assert write_outputs(source_dir, package_names, str(tmp_path.joinpath("batched")), "--batch-size", "5") == expected
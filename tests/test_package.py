@@ -0,0 +1,34 @@
+import os
+import sys
+
+from java2py import JavaToPython
+from package import PackageTemplateHelper
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from synthetic import SyntheticApi  # noqa: E402
+
+
+def test_streaming_holds_one_class(tmp_path):
+    source_dir = str(tmp_path.joinpath("sources"))
+    package_name = SyntheticApi(packages=1, classes=30).write(source_dir)[0]
+    j2p = JavaToPython(source_dir, stream=True)
+    try:
+        helper = PackageTemplateHelper(j2p.open_package(package_name))
+        expected = [klassfile.klass_name for klassfile in helper.ordered_klasses()]
+        imports = list(helper.imports)
+        for klass_name in expected:
+            j2p.parse_cache.release(package_name, klass_name)
+
+        helper = PackageTemplateHelper(j2p.open_package(package_name), release=True)
+        assert list(helper.imports) == imports
+        assert len(j2p.parse_cache) == 0
+        klass_names = []
+        for klassfile in helper.klasses:
+            assert len(j2p.parse_cache) <= 1
+            klass_names.append(klassfile.klass_name)
+        assert klass_names == expected
+        assert len(j2p.parse_cache) == 0
+    finally:
+        j2p.close()
@@ -0,0 +1,153 @@
+"""
+Generated stubs have to be valid PEP 484 stubs, every name they use defined
+"""
+import ast
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = {
+    "java/lang/Object.java": "package java.lang;\npublic class Object {\n}\n",
+    "java/lang/String.java": "package java.lang;\npublic final class String {\n    public int length() { return 0; }\n}\n",
+    "java/util/Collection.java": "package java.util;\npublic interface Collection<E> {\n    int size();\n}\n",
+    "java/util/List.java": """package java.util;
+public interface List<E> extends Collection<E> {
+    E get(int index);
+    boolean add(E e);
+    void add(int index, E element);
+}
+""",
+    "java/util/Map.java": "package java.util;\npublic interface Map<K, V> {\n    V get(Object key);\n}\n",
+    "java/net/URL.java": "package java.net;\npublic final class URL {\n    public String getHost() { return null; }\n}\n",
+    "demo/IService.java": """package demo;
+import java.util.List;
+import java.util.Map;
+import java.net.*;
+import static java.util.Map.get;
+
+public interface IService extends Base {
+    int PORT = 80;
+    Long TIMEOUT = 10L;
+    byte[] send(byte[] request);
+    byte[] send(String host, int port, byte[] request);
+    void put(int value);
+    void put(long value);
+    char[] chars(List<String> names, Map headers, Long timeout, Character c);
+    URL getUrl(java.lang.Object def, boolean in);
+    List<List<URL>> nested();
+    <T> T cast(Object o);
+    int yield(int a);
+    List<?> wild();
+    List<? extends Base> bounded();
+}
+""",
+    "demo/Base.java": "package demo;\npublic interface Base {\n}\n",
+    "demo/Map.java": "package demo;\npublic interface Map {\n}\n",
+}
+
+# burp on its own, the java classes it refers to are not part of the source tree
+BURP_SOURCES = {
+    "burp/IHttpService.java": """package burp;
+import java.net.URL;
+import java.util.List;
+import java.awt.*;
+
+public interface IHttpService {
+    String getHost();
+    URL getUrl(java.lang.Object key);
+    List<IHttpService> services();
+    Component getUiComponent();
+    Object getObject(Integer id);
+}
+""",
+}
+
+
+def write_sources(tmp_path_factory, sources):
+    source_dir = tmp_path_factory.mktemp("sources")
+    for filename, source in sources.items():
+        path = source_dir.joinpath(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    return str(source_dir)
+
+
+def generate_stubs(source_dir, outdir, backend, *package_names):
+    subprocess.run([sys.executable, os.path.join("java2py", "java2py.py"), "--sourcedir", source_dir,
+                    "--package", *package_names, "--recursive", "--format", "stub", "--outdir", outdir,
+                    "--backend", backend], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return outdir
+
+
+@pytest.fixture(scope="module")
+def source_dir(tmp_path_factory):
+    return write_sources(tmp_path_factory, SOURCES)
+
+
+@pytest.fixture(scope="module", params=["emitter", "jinja"])
+def stub_dir(request, source_dir, tmp_path_factory):
+    return generate_stubs(source_dir, str(tmp_path_factory.mktemp(f"stubs-{request.param}")), request.param,
+                          "demo", "java")
+
+
+@pytest.fixture(scope="module", params=["emitter", "jinja"])
+def burp_stub_dir(request, tmp_path_factory):
+    return generate_stubs(write_sources(tmp_path_factory, BURP_SOURCES),
+                          str(tmp_path_factory.mktemp(f"burp-stubs-{request.param}")), request.param, "burp")
+
+
+def read_stub(stub_dir, package_name):
+    with open(os.path.join(stub_dir, *package_name.split("."), "__init__.pyi"), encoding="utf-8") as fp:
+        return fp.read()
+
+
+def test_stubs_parse(stub_dir):
+    for package_name in ("demo", "java.lang", "java.util", "java.net"):
+        ast.parse(read_stub(stub_dir, package_name))
+
+
+def test_stub_declarations(stub_dir):
+    stub = read_stub(stub_dir, "demo")
+    assert "from java.util import List\n" in stub
+    assert "import java.net\n" in stub
+    assert "from java.util import Map\n" not in stub
+    assert "java.util.Map.get" not in stub
+    assert stub.count("    @overload\n    def send(") == 2
+    assert "    def put(self, value: int) -> None: ...\n" in stub
+    assert "@overload\n    def put(" not in stub
+    assert "    def chars(self, names: _List[str], headers: java.util.Map, timeout: int, c: str) -> _List[str]: ...\n" \
+        in stub
+    assert "    TIMEOUT: int\n" in stub
+    assert "    def getUrl(self, def_: _Any, in_: bool) -> java.net.URL: ...\n" in stub
+    assert "    def cast(self, o: java.lang.Object) -> _Any: ...\n" in stub
+    assert "import java.lang\n" in stub
+    assert "    def wild(self) -> _List[_Any]: ...\n" in stub
+    assert "    def bounded(self) -> _List[Base]: ...\n" in stub
+    assert "class List(Collection):" in read_stub(stub_dir, "java.util")
+
+
+def test_stubs_type_check(stub_dir, tmp_path):
+    api = pytest.importorskip("mypy.api")
+    stdout, stderr, status = api.run(["--no-incremental", "--cache-dir", str(tmp_path), stub_dir])
+    assert status == 0, stdout + stderr
+
+
+def test_burp_stub_declarations(burp_stub_dir):
+    stub = read_stub(burp_stub_dir, "burp")
+    assert "import java" not in stub
+    assert "from java" not in stub
+    assert "    def getHost(self) -> str: ...\n" in stub
+    assert "    def getUrl(self, key: _Any) -> _Any: ...\n" in stub
+    assert "    def services(self) -> _List[IHttpService]: ...\n" in stub
+    assert "    def getUiComponent(self) -> _Any: ...\n" in stub
+    assert "    def getObject(self, id: int) -> object: ...\n" in stub
+
+
+def test_burp_stubs_type_check(burp_stub_dir, tmp_path):
+    api = pytest.importorskip("mypy.api")
+    stdout, stderr, status = api.run(["--no-incremental", "--cache-dir", str(tmp_path), burp_stub_dir])
+    assert status == 0, stdout + stderr